@@ -2,7 +2,6 @@ from startup import *
 from random import randrange, sample, random
 from minigames import connectfour as cf, jotto as jo, hangman as hm, boggle as bg, risk as rk
 from utilities import words as wr
-from copy import deepcopy as copy
 from math import floor
 import time
 
@@ -118,10 +117,8 @@ async def anagrams(ctx: commands.Context):
     ana = ClientEmol(":closed_book:", hexcol("dd2e44"), ctx)
     message = await ana.say("Picking letters...")
 
-    while True:
-        letters = sample(wr.anagramsDist, 8)
-        if len(wr.anagrams("".join(letters))) > 20:
-            break
+    letters = await workers.in_thread(wr.good_rack)
+    words = wr.anagrams("".join(letters))
 
     def form(lts: list):
         return f"```prolog\n|\u00a0{chr(160).join([g.upper() for g in lts])}\u00a0|```\n"
@@ -139,7 +136,6 @@ async def anagrams(ctx: commands.Context):
         return {"d": f"{form(letters)}Time remaining: {round(timer())} s",
                 "footer": f"Used words: {none_list(sorted(guesses))}"}
 
-    words = wr.anagrams("".join(letters))
     guesses = []
     start = time.time()
     await ana.edit(
@@ -181,10 +177,7 @@ async def anagrams(ctx: commands.Context):
 async def boggle(ctx: commands.Context):
     bog = ClientEmol(":hourglass:", hexcol("ffac33"), ctx)
 
-    board = bg.Board()
-    possible = [g for g in wr.wordList if set(c.upper() for c in "q".join(g.split("qu"))) <= set(board.board)
-                and g[0].upper() in board.board and len(g) >= 3]
-    possible = [g for g in possible if board.find(g)]
+    board, possible = await workers.in_process(bg.generate)
 
     def timer():
         return 180 + start - time.time()
@@ -258,33 +251,15 @@ class DiscordRisk(rk.Game):
         self.dest = dest
         self.emol = ClientEmol(":drum:", hexcol("9D0522"), self.dest)
         self.users = {rk.playerOrder[g]: players[g] for g in range(len(players))}
-        self.image = rk.Image.open(rk.directory + "nqr.png")
+        self.renderer = rk.Renderer()
+        self.image = None
+        self.imageUrl = None
         self.statusMessage = None
         self.tempMessage = None
         self.saveState = rk.Game(str(self))
-        self.rewrite()
-
-    def rewrite(self):
-        self.image = copy(rk.main_map)
-        for province in self.board.provinces.values():
-            rk.merge_down(
-                rk.images[province.name][province.owner],
-                self.image,
-                *rk.imageCorners[province.name]
-            )
-        for province in self.board.provinces.values():
-            if province.name in self.capitals:
-                rk.merge_down(
-                    rk.capitals[self.capitals[province.name]],
-                    self.image,
-                    *rk.province_centers[province.name], True
-                )
-            if province.owner is not None:
-                rk.merge_down(
-                    rk.numbers[province.troops],
-                    self.image,
-                    *rk.province_centers[province.name], True
-                )
+
+    async def rewrite(self):
+        self.image = await workers.in_thread(self.renderer.render, self)
 
     @property
     async def should_quit(self):
@@ -300,12 +275,15 @@ class DiscordRisk(rk.Game):
             f"{sum([j.troops for j in self.board.provinces.values() if j.owner == g])} troops / "
             f"{floor(len([j for j in self.board.provinces.values() if j.owner == g]) / 2)} TPT" for g in self.players
         ])
-        self.image.save(f"images/risk-{str(self)[0]}.png")
+        await self.rewrite()
+        if self.imageUrl is None or self.renderer.changed:
+            self.imageUrl = await image_url(self.image)
+            self.renderer.changed = []
         kwargs = {
             "s": f"{self.playerOrder[self.atBat]}'s turn - {phase} Phase".upper(),
             "d": string,
             "footer": str(self.saveState),
-            "image": await image_url(f"images/risk-{str(self)[0]}.png")
+            "image": self.imageUrl
         }
         try:
             await self.emol.edit(self.statusMessage, **kwargs)
@@ -388,7 +366,6 @@ class DiscordRisk(rk.Game):
             for player in self.playerOrder:
                 valid_provinces = [g for g in self.board.provinces.values() if g.owner == player]
                 self.board.provinces[choice(valid_provinces).name].troops += 1
-        self.rewrite()
         self.saveState = rk.Game(str(self))
 
     async def move(self, fro: rk.Province, to: rk.Province, n: int):
@@ -398,7 +375,6 @@ class DiscordRisk(rk.Game):
             return await self.say("You can't abandon a province.")
         fro.troops -= n
         to.troops += n
-        self.rewrite()
 
     async def attack(self, fro: rk.Province, attack: int, to: rk.Province):
         if fro.name not in rk.borders[to.name]:
@@ -430,7 +406,6 @@ class DiscordRisk(rk.Game):
             fro.troops -= to.troops
         else:
             transfer_str = ""
-        self.rewrite()
         await self.say(f"Battle of {to.name}",
                        d=f"``ATTACKER:`` {attack_str}\n``DEFENDER:`` {defense_str}\n\n{losses_str}{transfer_str}")
 
@@ -558,7 +533,6 @@ class DiscordRisk(rk.Game):
                         continue
                     province.troops += troops
                     reinforcements -= troops
-                    self.rewrite()
                     if reinforcements == 0:
                         break
             else:
@@ -268,6 +268,7 @@ async def on_ready():
     print([g for g in zeph.all_commands if g not in aliases and not zeph.all_commands[g].hidden and
           (g not in commandFormats or g not in descs or g not in [j for k in commandCategories.values() for j in k])])
     setattr(zeph, "fortServers", [g for g in zeph.guilds if g.owner.id in [238390171022655489, 474398677599780886]])
+    print(assets.report())
     zeph.loop.create_task(initialize_planes())
     zeph.loop.create_task(zeph.load_romanization())
 
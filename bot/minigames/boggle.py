@@ -1,5 +1,10 @@
 from random import choice, sample
-adj = -5, -4, -3, -1, 1, 3, 4, 5
+from utilities.assets import LazyAsset
+from utilities.words import wordList
+neighbors = tuple(
+    tuple(4 * y + x for y in range(i // 4 - 1, i // 4 + 2) for x in range(i % 4 - 1, i % 4 + 2)
+          if 0 <= y < 4 and 0 <= x < 4 and 4 * y + x != i) for i in range(16)
+)
 
 
 def score(word: str):
@@ -27,38 +32,57 @@ class Board:
         self.guessed.append(word)
         self.points += score(word)
 
-    def adjs(self, index):
-        ret = {}
-        for a in adj:
-            if index + a in range(16) and \
-                    ((index + a) // 4 == index // 4 or a not in (-1, 1)) and \
-                    ((index + a) // 4 == index // 4 - 1 or a not in (-5, -4, -3)) and \
-                    ((index + a) // 4 == index // 4 + 1 or a not in (5, 4, 3)):
-                ret[a] = self.board[index + a]
-        return ret
-
     def find(self, word):
         word = "Q".join(word.lower().split("qu")).upper()
-        if word.upper()[0] not in self.board:
-            return False
-        starts = [g for g in range(16) if self.board[g] == word.upper()[0]]
-        for s in starts:
-            if self.path(word, s, [s]):
-                return True
-        return False
-
-    def path(self, word, index, used):
+        return bool(word) and any(self.path(word, g, 1 << g) for g in range(16) if self.board[g] == word[0])
+
+    def path(self, word, index, used: int):  # USED is a bitmask of board indices
         if len(word) == 1:
             return True
-        if word[1] not in self.adjs(index).values():
-            return False
-        tests = [(g + index) for g in self.adjs(index) if (g + index) not in used and self.board[g + index] == word[1]]
-        if len(tests) == 0:
-            return False
-        for g in tests:
-            if self.path(word[1:], g, [*used, g]):
-                return True
-        return False
+        return any(self.path(word[1:], g, used | 1 << g) for g in neighbors[index]
+                   if not used & 1 << g and self.board[g] == word[1])
+
+
+def build_trie():  # nested dicts of letters, with the words spelled out so far (if any) under None
+    ret = {}
+    for word in wordList:
+        if len(word) >= 3:
+            node = ret
+            for c in "q".join(word.split("qu")):
+                node = node.setdefault(c, {})
+            node.setdefault(None, []).append(word)
+    return ret
+
+
+trie = LazyAsset("boggle trie", build_trie)
+
+
+def solve(board: Board):
+    """Every word in the word list that can be found on BOARD, with its score. Walks the board once, following the
+    trie, so it never tries a path that can't lead to a word."""
+    letters = [g.lower() for g in board.board]
+    found = set()
+
+    def walk(node: dict, index: int, used: int):
+        node = node.get(letters[index])
+        if node is None:
+            return
+        found.update(node.get(None, ()))
+        for g in neighbors[index]:
+            if not used & 1 << g:
+                walk(node, g, used | 1 << g)
+
+    for i in range(16):
+        walk(trie.value, i, 1 << i)
+    return {g: score(g) for g in sorted(found)}
+
+
+def generate(minimum: int=15):  # rerolls until the board has at least MINIMUM words on it
+    while True:
+        board = Board()
+        possible = solve(board)
+        if len(possible) >= minimum:
+            return board, possible
 
 
 if __name__ == "__main__":
@@ -32,6 +32,18 @@ def merge_down(top: Image.Image, bottom: Image.Image, x: int=0, y: int=0, center
     bottom.alpha_composite(top, dest=(x, y))
 
 
+def merge_region(top: Image.Image, bottom: Image.Image, x: int, y: int, box: tuple, center: bool=False):
+    """Same as merge_down(), but only touches the part of BOTTOM inside BOX (left, upper, right, lower)."""
+    if center:
+        x -= round(top.width / 2)
+        y -= round(top.height / 2)
+    left, upper = max(x, box[0]), max(y, box[1])
+    right, lower = min(x + top.width, box[2]), min(y + top.height, box[3])
+    if left >= right or upper >= lower:
+        return
+    bottom.alpha_composite(top, dest=(left, upper), source=(left - x, upper - y, right - x, lower - y))
+
+
 if __name__ == "__main__":
     image = Image.open("C:/Users/Kaesekaiser/Pictures/bharat.jpg")
     print(np.array(image.convert("HSV")))
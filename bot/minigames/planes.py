@@ -1,12 +1,19 @@
 from math import sin, cos, asin, acos, pi, log10, floor, log, atan2, sqrt
-from random import choices, choice
+from random import Random
+from heapq import heappop, heappush
 from minigames.planecities import *
 from geopy.geocoders import Nominatim
 from time import time
 from pyquery import PyQuery
+from utilities import web
+import numpy as np
+import json
 import re
 rads = {"km": 6371, "mi": 3958.76}
 url = "https://www.google.com/maps/d/u/0/edit?hl=en&mid=1aoVneqZxmbqLxZrznFPyYbpKlCGC4hbx"
+snapshotPath = "storage/cities.json"
+snapshotVersion = 1
+jobLife = 900  # seconds each job stays on a board
 cd_url = "https://www.timeanddate.com/countdown/vacation?iso={}&p0=179&msg={}&font=slab&csz=1#"
 with open("storage/citycountries.txt", "r") as f:
     af = f.readlines()
@@ -24,8 +31,8 @@ specific_patterns = {
 }
 
 
-def readurl(s: str):
-    return str(PyQuery(s, {'title': 'CSS', 'printable': 'yes'}, encoding="utf8"))
+async def readurl(s: str):
+    return str(PyQuery(await web.fetch_text(s, {'title': 'CSS', 'printable': 'yes'})))
 
 
 def greatcirc(p1: tuple, p2: tuple, unit="km"):
@@ -111,8 +118,19 @@ def rewritecits():
             ff.write("{}|{}|\n".format(i, citcoundat[i]))
 
 
+def locate_country(name: str, coords: iter):
+    if name in citcoundat:
+        return citcoundat[name]
+    coun = Nominatim().reverse(coords).raw["address"]["country"]
+    coun = countredirs.get(coun, coun)
+    print(name, coun)
+    citcoundat[name] = coun
+    rewritecits()
+    return coun
+
+
 class City:
-    def __init__(self, name: str, coords: iter, val: int, no=0):
+    def __init__(self, name: str, coords: iter, val: int, no=0, country: str = None):
         self.name = name
         self.coords = coords
         self.radcoords = tuple(rad(c) for c in coords)
@@ -120,31 +138,29 @@ class City:
         self.value = round((lambda n: 70 * n ** 0.37)(val))
         self.no = no
         self.code = base36(self.no).rjust(2, "0")
-        if self.name in citcoundat:
-            coun = citcoundat[self.name]
-        else:
-            coun = Nominatim().reverse(self.coords).raw["address"]["country"]
-            coun = countredirs.get(coun, coun)
-            print(name, coun)
-            citcoundat[self.name] = coun
-            rewritecits()
+        coun = country if country else locate_country(self.name, self.coords)
         self.country = coun
         self.dict = {"Coordinates": f"({twodig(self.coords[0])}, {twodig(self.coords[1])})",
                      "Country": coun, "Annual Passengers": suff(val),
                      "Value": "Ȼ{}".format(addcomm(self.value))}
-        self.jobs = []
-        self.job_reset = 0
+        self.slots = []  # [(generation, job)], one per spot on the job board
+        self.board = []
+        self.next_job = 0
         if self.name.lower() not in cities:
             cities[self.name.lower()] = self
 
     @staticmethod
     def from_html(html: str):
-        return City(
-            re.search(specific_patterns["name"], html)[0],
-            [float(g) for g in re.search(specific_patterns["coords"], html)[0].split(",")],
-            int(re.search(specific_patterns["val"], html)[0]),
-            int(re.search(specific_patterns["no"], html)[0])
-        )
+        return City.from_entry(parse_city(html))
+
+    @staticmethod
+    def from_entry(entry: dict):
+        return City(entry["name"], entry["coords"], entry["passengers"], entry["no"], entry.get("country"))
+
+    @property
+    def entry(self):  # for snapshots
+        return {"name": self.name, "coords": list(self.coords), "passengers": self.passengers, "no": self.no,
+                "country": self.country}
 
     def __eq__(self, other):
         return self.name == other.name
@@ -152,15 +168,48 @@ class City:
     def dist(self, other):
         return greatcirc(self.radcoords, other.radcoords)
 
-    def rpj(self):
-        ds = choices(list(cities.values()), weights=[2 ** priority(self, g) for g in cities.values()],
-                     k=round((log(self.passengers, 10) - 2.75) ** 2.5 * 1.5))
-        self.jobs = sorted([Job(self, cities[g.name.lower()]) for g in ds],
-                           key=lambda jb: jb.pay, reverse=True)
-        for j in range(len(self.jobs)):
-            self.jobs[j].code += \
-                choice([chr(g) for g in range(65, 91) if chr(g) not in
-                        [self.jobs[h].code[4] for h in range(j) if self.jobs[h].code[:4] == self.jobs[j].code[:4]]])
+    @property
+    def job_count(self):
+        return round((log(self.passengers, 10) - 2.75) ** 2.5 * 1.5)
+
+    def generation(self, slot: int, tm: float):  # which job SLOT is on at TM. slots expire staggered, not all at once
+        return int((tm + slot * jobLife / self.job_count) // jobLife)
+
+    def expiry(self, slot: int, generation: int):
+        return (generation + 1) * jobLife - slot * jobLife / self.job_count
+
+    def make_job(self, slot: int, generation: int, taken: set):
+        """The job in SLOT for GENERATION. Seeded by both, so it comes out the same every time it's generated; only
+        the last letter can change, if another job to the same city already has it (TAKEN)."""
+        rng = Random(f"{self.name}/{slot}/{generation}")
+        table = get_table()
+        weights = table.job_weights(self)
+        job = Job(self, table.cities[int(np.searchsorted(weights, rng.random() * weights[-1], side="right"))])
+        letters = [chr(g) for g in range(65, 91) if job.code + chr(g) not in taken]
+        job.code += rng.choice(letters)
+        return job
+
+    @property
+    def jobs(self):  # only the slots that have expired since the last look get new jobs
+        tm = time()
+        if tm >= self.next_job:
+            self.top_up(tm)
+        return self.board
+
+    def top_up(self, tm: float):
+        if len(self.slots) != self.job_count:
+            self.slots = [(None, None)] * self.job_count
+        taken = {g.code for n, g in self.slots if g is not None}
+        for slot in range(len(self.slots)):
+            generation = self.generation(slot, tm)
+            if self.slots[slot][0] != generation:
+                if self.slots[slot][1] is not None:
+                    taken.discard(self.slots[slot][1].code)
+                job = self.make_job(slot, generation, taken)
+                taken.add(job.code)
+                self.slots[slot] = (generation, job)
+        self.next_job = min((self.expiry(n, g[0]) for n, g in enumerate(self.slots)), default=tm + jobLife)
+        self.board = sorted([g for n, g in self.slots], key=lambda jb: jb.pay, reverse=True)
 
 
 class Path:
@@ -213,7 +262,7 @@ class Country:
     @staticmethod
     def from_name_only(name: str):
         """Requires that all cities have already been created."""
-        return Country(name, [g for g in cities.values() if g.country.lower() == name.lower()])
+        return Country(name, get_table().in_country(name))
 
 
 class Plane:
@@ -356,6 +405,17 @@ class User:
     def jobs(self):
         return [g for item in self.planes.values() for g in item.jobs]
 
+    def arrive(self, craft: Plane):  # moves CRAFT to the next stop on its path, and pays for any jobs delivered there
+        craft.path.iterate(craft.travel(craft.path[0], craft.path[1]))
+        ret = 0
+        for i in [g for g in craft.jobs]:
+            job = Job.from_str(i)
+            if job.destination == craft.path[0]:
+                craft.unload(i)
+                self.credits += job.pay
+                ret += job.pay
+        return ret
+
     def rename(self, old_name: str, new_name: str):
         self.planes[new_name.lower()] = self.planes[old_name.lower()]
         del self.planes[old_name.lower()]
@@ -370,11 +430,252 @@ def find_country(s: str):
     return countries[k_alias.get(s.lower(), backCountries.get(s.lower(), s.lower())).lower()]
 
 
+def parse_city(html: str):
+    return {
+        "name": re.search(specific_patterns["name"], html)[0],
+        "coords": [float(g) for g in re.search(specific_patterns["coords"], html)[0].split(",")],
+        "passengers": int(re.search(specific_patterns["val"], html)[0]),
+        "no": int(re.search(specific_patterns["no"], html)[0])
+    }
+
+
+def parse_cities(html: str):  # every city on the My Maps page, minus repeated names, in the order they'd be loaded
+    ret = {}
+    for i in re.findall(pattern, html):
+        entry = parse_city(i)
+        ret.setdefault(entry["name"].lower(), entry)
+    return list(ret.values())
+
+
+def read_snapshot(path: str = snapshotPath):
+    with open(path, "r", encoding="utf8") as r:
+        ret = json.load(r)
+    if ret.get("version") != snapshotVersion:
+        raise ValueError(f"city snapshot is version {ret.get('version')}; expected {snapshotVersion}")
+    return ret
+
+
+def write_snapshot(entries: list, path: str = snapshotPath):
+    with open(path, "w", encoding="utf8") as w:
+        json.dump({"version": snapshotVersion, "source": url, "updated": round(time()), "cities": entries}, w,
+                  ensure_ascii=False, indent=1)
+
+
+def load_snapshot(path: str = snapshotPath):
+    for entry in read_snapshot(path)["cities"]:
+        City.from_entry(entry)
+
+
+def diff_snapshots(old: list, new: list):
+    old_dict, new_dict = {g["name"]: g for g in old}, {g["name"]: g for g in new}
+    ret = [f"+ {g}" for g in new_dict if g not in old_dict] + [f"- {g}" for g in old_dict if g not in new_dict]
+    for name in [g for g in new_dict if g in old_dict]:
+        for key in ("coords", "passengers", "country"):
+            if old_dict[name].get(key) != new_dict[name].get(key):
+                ret.append(f"~ {name} {key}: {old_dict[name].get(key)} -> {new_dict[name].get(key)}")
+    old_index = {g["name"]: n for n, g in enumerate(old)}
+    moved = [g["name"] for n, g in enumerate(new) if old_index.get(g["name"], n) != n]
+    if moved:
+        ret.append(f"! {len(moved)} cities have moved, so saved city codes will point to different cities")
+    return ret
+
+
+async def refresh_snapshot(write: bool = False):
+    """Checks the snapshot against the My Maps source, and prints the differences. With WRITE, replaces it."""
+    entries = parse_cities(await readurl(url))
+    try:
+        old = read_snapshot()["cities"]
+    except FileNotFoundError:
+        old = []
+    known = {g["name"]: g["country"] for g in old}
+    for entry in entries:
+        entry["country"] = known.get(entry["name"]) or locate_country(entry["name"], entry["coords"])
+    print("\n".join(diff_snapshots(old, entries)) or "No changes.")
+    if write:
+        write_snapshot(entries)
+        print(f"Wrote {len(entries)} cities to {snapshotPath}.")
+    await web.close()
+
+
+class CityTable:
+    """Every city, in the order they were loaded - which is what city codes count - with their coordinates and traffic
+    packed into arrays for number crunching."""
+
+    def __init__(self, cits: iter):
+        self.cities = list(cits)
+        self.index = {g.name.lower(): n for n, g in enumerate(self.cities)}
+        self.countries = {}
+        for city in self.cities:
+            self.countries.setdefault(city.country.lower(), []).append(city)
+        self.coords = np.array([g.coords for g in self.cities], dtype=float).reshape(-1, 2)
+        self.radcoords = np.radians(self.coords)
+        self.passengers = np.array([g.passengers for g in self.cities], dtype=float)
+        self._distances = None
+        self._priorities = None
+        self._nearest = None
+        self._nearestDistances = None
+        self._grid = None
+        self._jobWeights = {}
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __getitem__(self, item: int):
+        return self.cities[item]
+
+    def in_country(self, name: str):
+        return list(self.countries.get(name.lower(), []))
+
+    @property
+    def distances(self):  # greatcirc() between every pair of cities, in km
+        if self._distances is None:
+            lat, lon = self.radcoords[:, 0], self.radcoords[:, 1]
+            cosines = np.outer(np.sin(lat), np.sin(lat)) + \
+                np.outer(np.cos(lat), np.cos(lat)) * np.cos(np.abs(lon[None, :] - lon[:, None]))
+            self._distances = np.round(rads["km"] * np.arccos(np.clip(cosines, -1, 1)), 2)
+            np.fill_diagonal(self._distances, 0)
+        return self._distances
+
+    @property
+    def priorities(self):  # priority() from every city (rows) to every city (columns)
+        if self._priorities is None:
+            traffic = np.log10(self.passengers)
+            airport_factor = traffic - 2
+            x = 4 / airport_factor
+            ff = (-1 / 3 * x ** -3 + 4 / 3 * (x - 1) ** 3 + 4 / 3) ** 1.5
+            countries = [g.country for g in self.cities]
+            domestic = np.array(countries)[:, None] == np.array(countries)[None, :]
+            domestic_factor = np.where(domestic, ((7.5 - airport_factor) / 2)[:, None], 0)
+            dist_factor = 20 - self.distances / 1000 * ff[:, None]
+            self._priorities = np.maximum(airport_factor[None, :] + dist_factor + domestic_factor, 0)
+            self._priorities[self.distances <= traffic[:, None] * 25] = -100
+        return self._priorities
+
+    def job_weights(self, city: City):  # cumulative odds of each city being a job's destination from CITY
+        if city.name.lower() not in self._jobWeights:
+            self._jobWeights[city.name.lower()] = np.cumsum(np.exp2(self.priorities[self.index[city.name.lower()]]))
+        return self._jobWeights[city.name.lower()]
+
+    def ranked(self, city: City):  # every city, from highest to lowest priority from CITY
+        return [self.cities[g] for g in np.argsort(-self.priorities[self.index[city.name.lower()]], kind="stable")]
+
+    @property
+    def grid(self):
+        if self._grid is None:
+            self._grid = SpatialGrid(self.coords)
+        return self._grid
+
+    def within(self, city: City, radius: float):  # [(city, distance)] of other cities within RADIUS km, nearest first
+        return [(self.cities[i], d) for i, d in self.grid.within(city.coords, radius) if self.cities[i] != city]
+
+    def nearest(self, city: City, k: int):  # [(city, distance)] of the K nearest other cities
+        return [(self.cities[i], d) for i, d in self.grid.nearest(city.coords, k + 1) if self.cities[i] != city][:k]
+
+    def reachable(self, index: int, limit: float):  # every city within LIMIT km of city INDEX, nearest first
+        if self._nearest is None:  # each row sorted once, so any range is just a binary search away
+            self._nearest = np.argsort(self.distances, axis=1, kind="stable").astype(np.int32)
+            self._nearestDistances = np.take_along_axis(self.distances, self._nearest, axis=1)
+        return self._nearest[index, :np.searchsorted(self._nearestDistances[index], limit, side="right")]
+
+
+table = CityTable([])
+
+
+def get_table():  # rebuilds the table if cities have been added since it was built
+    global table
+    if len(table) != len(cities):
+        table = CityTable(cities.values())
+    return table
+
+
+class SpatialGrid:
+    """Sorts points (latitude, longitude) into SIZE-degree cells, so that finding the points near somewhere only means
+    measuring the distance to the points in the cells around it."""
+
+    def __init__(self, coords: np.ndarray, size: float = 5):
+        self.size = size
+        self.coords = coords
+        self.radcoords = np.radians(coords)
+        self.rows, self.cols = int(np.ceil(180 / size)), int(np.ceil(360 / size))
+        self.cells = {}
+        for n, (lat, lon) in enumerate(coords):
+            self.cells.setdefault(self.cell(lat, lon), []).append(n)
+
+    def cell(self, lat: float, lon: float):
+        return min(int((lat + 90) // self.size), self.rows - 1), int((lon + 180) // self.size) % self.cols
+
+    def distances(self, point: iter, indices: list):  # greatcirc() from POINT to each of INDICES, in km
+        lat, lon = rad(point[0]), rad(point[1])
+        others = self.radcoords[indices].reshape(-1, 2)
+        cosines = sin(lat) * np.sin(others[:, 0]) + cos(lat) * np.cos(others[:, 0]) * np.cos(np.abs(others[:, 1] - lon))
+        return np.round(rads["km"] * np.arccos(np.clip(cosines, -1, 1)), 2)
+
+    def candidates(self, point: iter, radius: float):  # every point in a cell that could be within RADIUS km
+        angle = (radius + 1) / rads["km"]
+        lat = rad(point[0])
+        low, high = max(point[0] - angle * 180 / pi, -90), min(point[0] + angle * 180 / pi, 90)
+        rows = range(self.cell(low, 0)[0], self.cell(high, 0)[0] + 1)
+        if abs(lat) + angle >= pi / 2 or sin(angle) >= cos(lat):  # the circle covers a pole, so every longitude
+            cols = range(self.cols)
+        else:
+            span = asin(sin(angle) / cos(lat)) * 180 / pi
+            cols = {g % self.cols for g in range(int((point[1] - span + 180) // self.size),
+                                                 int((point[1] + span + 180) // self.size) + 1)}
+        return [i for r in rows for c in cols for i in self.cells.get((r, c), ())]
+
+    def within(self, point: iter, radius: float):  # [(index, distance)] of every point within RADIUS km, nearest first
+        indices = self.candidates(point, radius)
+        if not indices:
+            return []
+        distances = self.distances(point, indices)
+        return sorted([(i, d) for i, d in zip(indices, distances.tolist()) if d <= radius], key=lambda x: x[1])
+
+    def nearest(self, point: iter, k: int):  # [(index, distance)] of the K nearest points
+        radius = self.size * rads["km"] * pi / 180
+        while True:
+            ret = self.within(point, radius)
+            if len(ret) >= k or radius >= pi * rads["km"]:
+                return ret[:k]
+            radius *= 2
+
+
+def best_jobs(jobs: list, stops: list, slots: int):
+    """The best-paying jobs to load for a flight along STOPS, given SLOTS open slots. Only jobs headed to one of the
+    stops get paid, and every job takes exactly one slot, so the top-paying ones are always the best set."""
+    stops = {g.name for g in stops}
+    return sorted([g for g in jobs if g.destination.name in stops], key=lambda j: j.pay, reverse=True)[:slots]
+
+
+def plan_route(start: City, end: City, reach: float, allowed: iter):
+    """The shortest path from START to END (not including START) that only stops at ALLOWED cities and never flies
+    more than REACH km at a time, or None if there isn't one. Shortest is also cheapest, since fuel use is per km."""
+    table = get_table()
+    fro, to = table.index[start.name.lower()], table.index[end.name.lower()]
+    allowed = {table.index[g.name.lower()] for g in allowed} | {to}
+    remaining = table.distances[:, to]  # as the crow flies, so never more than the real remaining distance
+    best, previous = {fro: 0}, {}
+    queue = [(remaining[fro], 0, fro)]
+    while queue:
+        estimate, dist, index = heappop(queue)
+        if index == to:
+            ret = [to]
+            while ret[-1] != fro:
+                ret.append(previous[ret[-1]])
+            return [table[g] for g in ret[-2::-1]]
+        if dist > best[index]:
+            continue
+        for neighbor in table.reachable(index, reach):
+            neighbor = int(neighbor)
+            if neighbor in allowed and dist + table.distances[index, neighbor] < best.get(neighbor, float("inf")):
+                best[neighbor] = dist + table.distances[index, neighbor]
+                previous[neighbor] = index
+                heappush(queue, (best[neighbor] + remaining[neighbor], best[neighbor], neighbor))
+    return None
+
+
 def code_city(s: str):
     try:
-        ret = list(cities.values())[int(s, 36)]
-        assert isinstance(ret, City)
-        return ret
+        return get_table()[int(s, 36)]
     except IndexError:
         raise ValueError("invalid city code")
 
@@ -464,3 +765,9 @@ specialCases = {
 }
 planemojis = {**{"".join(emojiCountries[g].split()): g for g in emojiCountries}, **specialCases}
 backCountries = {j: g for g, j in planemojis.items()}
+
+
+if __name__ == "__main__":  # python -m minigames.planes [--write], from the bot directory
+    import asyncio
+    import sys
+    asyncio.get_event_loop().run_until_complete(refresh_snapshot("--write" in sys.argv))
@@ -1,6 +1,12 @@
 from minigames.imaging import *
+from utilities.assets import LazyAsset
+from hashlib import sha1
 from math import log, ceil
+from os import listdir, makedirs, path, replace
+from shutil import rmtree
 from random import choice, randrange, sample
+from tempfile import mkdtemp
+from time import time
 from typing import Union
 
 
@@ -161,18 +167,72 @@ province_centers = {
     "Yakutsk": (1596, 222),
     "Yukon": (278, 234)
 }
-images = {
-    g: {
-        j: global_fill(Image.open(directory + f"{g}.png"), colors["Red"], colors[j]) for j in colors
-    } for g in borders
-}
-main_map = Image.open(directory + "nqr.png").convert("RGBA")
-numbers = {
+
+
+class SpriteCache:
+    """Province sprites recolored for every player color. They're rendered once and saved under
+    ``risk_dir/cache/<key>/``, where the key is a hash of the source PNGs and the colors, so changing either one
+    rebuilds the cache. The cache is built in a temporary directory and renamed into place once it's complete, so an
+    interrupted build is never mistaken for a finished one. Sprites are only read off the disk when they're actually asked for.
+
+    Index it like ``images[province, color]``."""
+
+    def __init__(self, source: str, provinces: iter, cols: dict):
+        self.source = source
+        self.provinces = list(provinces)
+        self.colors = cols
+        self.key = self.hash()
+        self.dir = f"{source}cache/{self.key}/"
+        self.sprites = {}
+        if not self.complete():
+            self.build()
+
+    def hash(self):
+        ret = sha1(repr(sorted((str(g), j) for g, j in self.colors.items())).encode())
+        for province in self.provinces:
+            with open(self.source + f"{province}.png", "rb") as fp:
+                ret.update(fp.read())
+        return ret.hexdigest()[:16]
+
+    def complete(self):  # caches from before builds were atomic could be cut off partway
+        return path.isdir(self.dir) and len(listdir(self.dir)) >= len(self.provinces) * len(self.colors)
+
+    def file(self, province: str, color: str):
+        return self.dir + f"{province}-{color}.png"
+
+    def build(self):
+        print("Building Risk sprite cache...")
+        makedirs(self.source + "cache/", exist_ok=True)
+        temp = mkdtemp(prefix=f"{self.key}.", dir=self.source + "cache/")
+        for province in self.provinces:
+            base = Image.open(self.source + f"{province}.png")
+            for color in self.colors:
+                global_fill(base, self.colors["Red"], self.colors[color]).save(f"{temp}/{province}-{color}.png")
+        if path.isdir(self.dir) and not self.complete():
+            rmtree(self.dir)
+        try:
+            replace(temp, self.dir)
+        except OSError:  # someone else finished building it first
+            rmtree(temp)
+        for old in listdir(self.source + "cache/"):  # older caches, and any builds that were cut off
+            if old != self.key:
+                rmtree(self.source + "cache/" + old, ignore_errors=True)
+
+    def __getitem__(self, item: tuple):
+        if item not in self.sprites:
+            self.sprites[item] = Image.open(self.file(*item)).convert("RGBA")
+        return self.sprites[item]
+
+
+images = LazyAsset("risk provinces", lambda: SpriteCache(directory, borders, colors))
+main_map = LazyAsset("risk map", lambda: Image.open(directory + "nqr.png").convert("RGBA"))
+numbers = LazyAsset("risk numbers", lambda: {
     g: Image.open(directory + f"{g}.png").convert("RGBA") for g in range(1, 33)
-}
-capitals = {
+})
+capitals = LazyAsset("risk capitals", lambda: {
     g: Image.open(directory + f"capital{g}.png").convert("RGBA") for g in list(colors)[:-1]
-}
+})
+spriteSizes = LazyAsset("risk sprite sizes", lambda: {g: Image.open(directory + f"{g}.png").size for g in borders})
 
 
 def dec(n: str, fro: int):
@@ -311,26 +371,82 @@ class Game:
         )
 
     def print(self):
-        base = Image.open(directory + "nqr.png")
-        for province in self.board.provinces.values():
-            if province.owner is not None:
-                merge_down(
-                    images[province.name][province.owner],
-                    base,
-                    *imageCorners[province.name]
-                )
-            if province.name in self.capitals:
-                merge_down(
-                    capitals[self.capitals[province.name]],
-                    base,
-                    *province_centers[province.name], True
-                )
-            merge_down(
-                numbers[province.troops],
-                base,
-                *province_centers[province.name], True
-            )
-        return base
+        return Renderer().render(self)
+
+
+def overlaps(box1: tuple, box2: tuple):
+    return box1[0] < box2[2] and box2[0] < box1[2] and box1[1] < box2[3] and box2[1] < box1[3]
+
+
+class Renderer:
+    """Draws a game onto the map. Remembers what every province looked like in the last frame, so that the next frame
+    only redraws the provinces whose owner, troops, or capital changed - along with anything that overlaps them."""
+
+    def __init__(self):
+        self.image = None
+        self.state = {}
+        self.changed = []
+        width, height = main_map.value.size
+        label_w = max(g.width for g in [*numbers.value.values(), *capitals.value.values()]) + 2
+        label_h = max(g.height for g in [*numbers.value.values(), *capitals.value.values()]) + 2
+        self.sprites = {
+            g: (imageCorners[g][0], imageCorners[g][1],
+                imageCorners[g][0] + spriteSizes[g][0], imageCorners[g][1] + spriteSizes[g][1]) for g in borders
+        }
+        self.labels = {
+            g: (province_centers[g][0] - label_w // 2 - 1, province_centers[g][1] - label_h // 2 - 1,
+                province_centers[g][0] + label_w // 2 + 1, province_centers[g][1] + label_h // 2 + 1) for g in borders
+        }
+        self.regions = {  # everything a province can draw on, clipped to the map
+            g: (max(min(self.sprites[g][0], self.labels[g][0]), 0), max(min(self.sprites[g][1], self.labels[g][1]), 0),
+                min(max(self.sprites[g][2], self.labels[g][2]), width),
+                min(max(self.sprites[g][3], self.labels[g][3]), height)) for g in borders
+        }
+
+    def draw(self, game: Game, box: tuple):
+        self.image.paste(main_map.value.crop(box), box[:2])
+        for province in game.board.provinces.values():
+            if overlaps(self.sprites[province.name], box):
+                merge_region(images[province.name, province.owner], self.image, *imageCorners[province.name], box)
+        for province in game.board.provinces.values():
+            if overlaps(self.labels[province.name], box):
+                if province.name in game.capitals:
+                    merge_region(capitals[game.capitals[province.name]], self.image,
+                                 *province_centers[province.name], box, True)
+                if province.owner is not None:
+                    merge_region(numbers[province.troops], self.image, *province_centers[province.name], box, True)
+
+    def render(self, game: Game):
+        state = {g.name: (g.owner, g.troops, game.capitals.get(g.name)) for g in game.board.provinces.values()}
+        if self.image is None:
+            self.image = main_map.value.copy()
+            self.changed = list(state)
+            self.draw(game, (0, 0, *self.image.size))
+        else:
+            self.changed = [g for g in state if state[g] != self.state.get(g)]
+            for province in self.changed:
+                self.draw(game, self.regions[province])
+        self.state = state
+        return self.image
+
+
+def benchmark(frames: int=50):
+    """Times full redraws against incremental ones, over a string of random troop changes."""
+    game = Game()
+    renderer = Renderer()
+    renderer.render(game)
+    full, incremental = 0, 0
+    for i in range(frames):
+        for province in sample(list(game.board.provinces.values()), 2):
+            province.troops = randrange(32) + 1
+        start = time()
+        Renderer().render(game)
+        full += time() - start
+        start = time()
+        renderer.render(game)
+        incremental += time() - start
+    return f"full: {round(1000 * full / frames, 1)} ms/frame / " \
+           f"incremental: {round(1000 * incremental / frames, 1)} ms/frame"
 
 
 if __name__ == '__main__':
@@ -341,3 +457,4 @@ if __name__ == '__main__':
     print(Game(p).full_str())
     print(str(Game(p)))
     print("\n" + str(game.full_str() == Game(p).full_str()))
+    print(benchmark())
@@ -1,10 +1,10 @@
 from utils import *
 from pokemon import mons as pk
-import json
 
 
-with open("pokemon/dex.json", "r") as file:
-    dexEntries = json.load(file)
+dexEntries = pk.dexEntries
+monIndex = assets.LazyAsset("pok\u00e9mon name index", lambda: wr.FuzzyIndex(pk.fixedDex, key=str))
+nameAliases = {"nidoran": "Nidoran-F"}
 
 
 ballColors = {
@@ -21,22 +21,47 @@ def ball_emol():
     return Emol(zeph.emojis[f"{ret}_ball"], hexcol(ballColors[ret]))
 
 
+def name_tokens(s: str):
+    return set(pk.fix(s, "_").split("_"))
+
+
+class NameIndex:
+    """Finds the Pok\u00e9mon named in a string by the words in it: the first species whose name is made up entirely
+    of words in the string, and then the first of its forms that is too."""
+
+    def __init__(self):
+        self.species = list(pk.natDex)
+        self.sizes = [len(name_tokens(g)) for g in self.species]
+        self.index = {}  # {word: [dex index of every species with that word in its name]}
+        for n, g in enumerate(self.species):
+            for token in name_tokens(g):
+                self.index.setdefault(token, []).append(n)
+        self.forms = {g: [(name_tokens(k), k) for k in j.forms] for g, j in pk.natDex.items()}
+
+    def find(self, s: str):  # (species, form), or None if no species matches
+        words = name_tokens(s)
+        hits = {}
+        for word in words:
+            for n in self.index.get(word, ()):
+                hits[n] = hits.get(n, 0) + 1
+        matches = [n for n, g in hits.items() if g == self.sizes[n]]
+        if not matches:
+            return None
+        spc = self.species[min(matches)]
+        return spc, next((k for g, k in self.forms[spc] if g <= words), None)
+
+
+nameIndex = assets.LazyAsset("pok\u00e9mon name tokens", NameIndex)
+
+
 def find_mon(s: str):
-    for mon in pk.natDex:
-        if set(pk.fix(mon, "_").split("_")) <= set(pk.fix(s, "_").split("_")):
-            ret = mon, pk.fix("-".join(re.split(pk.fix(mon), pk.fix(s))))
-            break
-    else:
-        if pk.fix(s) == "nidoran":
-            ret = "Nidoran-F", ""
-        else:
-            guess = sorted(list(pk.fixedDex), key=lambda c: wr.levenshtein(c, pk.fix(s)))
-            raise commands.CommandError(f"``{s}`` not found. Did you mean {pk.fixedDex[guess[0]]}?")
-    for form in pk.natDex[ret[0]].forms:
-        if set(pk.fix(form, "_").split("_")) <= set(pk.fix(s, "_").split("_")):
-            return pk.Mon(ret[0], form=form)
-    else:
-        return pk.Mon(ret[0])
+    ret = nameIndex.value.find(s)
+    if ret is None:
+        if pk.fix(s) not in nameAliases:
+            guess = monIndex.value.closest(pk.fix(s))
+            raise commands.CommandError(f"``{s}`` not found. Did you mean {pk.fixedDex[guess[0][1]]}?")
+        ret = nameAliases[pk.fix(s)], None
+    return pk.Mon(ret[0]) if ret[1] is None else pk.Mon(ret[0], form=ret[1])
 
 
 def dex_entry(mon: pk.Mon):
@@ -217,18 +242,7 @@ class EffNavigator(Navigator):
 
     @property
     def eff_dict(self):
-        def eff(atk: str, dfn: str):
-            return pk.effectiveness[atk].get(dfn, 1)
-
-        ret = {
-            "4x": ", ".join([g for g in pk.types if eff(g, self.type1) * eff(g, self.type2) == 4]),
-            "2x": ", ".join([g for g in pk.types if eff(g, self.type1) * eff(g, self.type2) == 2]),
-            "1x": ", ".join([g for g in pk.types if eff(g, self.type1) * eff(g, self.type2) == 1]),
-            "1/2x": ", ".join([g for g in pk.types if eff(g, self.type1) * eff(g, self.type2) == 0.5]),
-            "1/4x": ", ".join([g for g in pk.types if eff(g, self.type1) * eff(g, self.type2) == 0.25]),
-            "0x": ", ".join([g for g in pk.types if eff(g, self.type1) * eff(g, self.type2) == 0])
-        }
-        return {g: j for g, j in ret.items() if j}
+        return pk.effBuckets[(self.type1, self.type2)]
 
     def type1for(self):
         self.type1 = pk.types[(pk.types.index(self.type1) + 1) % len(pk.types)]
@@ -270,18 +284,46 @@ async def pokemon(ctx: commands.Context, func: str = None, *args):
     return await PokemonInterpreter(ctx).run(str(func).lower(), *args)
 
 
+statAliases = {
+    "hp": 0, "atk": 1, "attack": 1, "def": 2, "dfn": 2, "defense": 2, "spa": 3, "spatk": 3, "special-attack": 3,
+    "spd": 4, "spdef": 4, "special-defense": 4, "spe": 5, "speed": 5, "total": 6, "bst": 6
+}
+statLabels = ["HP", "Attack", "Defense", "Sp. Atk", "Sp. Def", "Speed", "Total"]
+
+
 class PokemonInterpreter(Interpreter):
     @staticmethod
     def type_emol(typ: str):
         return Emol(zeph.emojis[typ.title()], hexcol(pk.typeColors[typ]))
 
+    @staticmethod
+    def read_team(args: tuple):
+        team = [g.strip() for g in " ".join(args).split(",") if g.strip()]
+        if not team:
+            raise commands.CommandError("Input some Pok\u00e9mon, separated by commas.")
+        if len(team) > 6:
+            raise commands.CommandError("A team can only have six Pok\u00e9mon.")
+        return [find_mon(g) for g in team]
+
+    @staticmethod
+    def read_level(s: str):
+        if not can_int(s) or not 1 <= int(s) <= 100:
+            raise commands.CommandError("Level has to be a number from 1 to 100.")
+        return int(s)
+
     async def _help(self, *args):
         help_dict = {
             "type": "``z!pokemon type <type>`` shows type effectiveness (offense and defense) for a given type.",
             "eff": "``z!pokemon eff`` checks type matchups against a type combination. Use the buttons "
                    f"({zeph.emojis['left1']}{zeph.emojis['right1']}{zeph.emojis['left2']}{zeph.emojis['right2']}) "
                    "to change types.\n``z!pokemon eff <mon...>`` shows matchups against a given species or form.\n"
-                   "``z!pokemon eff <type1> [type2]`` shows matchups against a given type combination."
+                   "``z!pokemon eff <type1> [type2]`` shows matchups against a given type combination.",
+            "coverage": "``z!pokemon coverage <mon>, [mon...]`` ranks the attacking types that hit a team of up to six "
+                        "Pok\u00e9mon the hardest. Separate the Pok\u00e9mon with commas.",
+            "stats": "``z!pokemon stats [level] <mon>, [mon...]`` compares the stats of up to six Pok\u00e9mon at a "
+                     "given level (default 100).\n``z!pokemon stats rank <stat> [level]`` ranks every species and form "
+                     "by a stat (``hp``, ``atk``, ``def``, ``spa``, ``spd``, ``spe``, or ``total``). Both assume a "
+                     "neutral nature, 31 IVs, and no EVs."
         }
 
         if not args or args[0].lower() not in help_dict:
@@ -298,13 +340,14 @@ class PokemonInterpreter(Interpreter):
         if typ.title() not in pk.types:
             raise commands.CommandError(f"{typ} isn't a type.")
 
+        offense, defense = pk.effMatrix[pk.typeIndex[typ], :len(pk.types)], pk.effMatrix[:, pk.typeIndex[typ]]
         eff = {
-            "Super effective against": [g for g in pk.types if pk.effectiveness[typ][g] > 1],
-            "Not very effective against": [g for g in pk.types if 0 < pk.effectiveness[typ][g] < 1],
-            "Ineffective against": [g for g in pk.types if not pk.effectiveness[typ][g]],
-            "Immune to": [g for g in pk.types if not pk.effectiveness[g][typ]],
-            "Resistant to": [g for g in pk.types if 0 < pk.effectiveness[g][typ] < 1],
-            "Weak to": [g for g in pk.types if pk.effectiveness[g][typ] > 1]
+            "Super effective against": [g for g, j in zip(pk.types, offense) if j > 1],
+            "Not very effective against": [g for g, j in zip(pk.types, offense) if 0 < j < 1],
+            "Ineffective against": [g for g, j in zip(pk.types, offense) if not j],
+            "Immune to": [g for g, j in zip(pk.types, defense) if not j],
+            "Resistant to": [g for g, j in zip(pk.types, defense) if 0 < j < 1],
+            "Weak to": [g for g, j in zip(pk.types, defense) if j > 1]
         }
         return await self.type_emol(typ).send(
             self.ctx, f"{typ}-type", fs={g: ", ".join(j) for g, j in eff.items() if j}, same_line=True
@@ -321,6 +364,43 @@ class PokemonInterpreter(Interpreter):
 
         return await EffNavigator(*types).run(self.ctx)
 
+    async def _coverage(self, *args):
+        team = self.read_team(args)
+        ranked = pk.coverage(team)[:5]
+        return await ball_emol().send(
+            self.ctx, "Best coverage against " + ", ".join(g.full_name for g in team),
+            d="\n".join(
+                f"{zeph.emojis[g.title()]} **{g}**: super effective against {sum(k > 1 for k in j)}/{len(team)} "
+                f"({' ／ '.join(pk.effLabels[k] for k in j)})" for g, j in ranked
+            )
+        )
+
+    async def _stats(self, *args):
+        if args and args[0].lower() == "rank":
+            return await self.rank_stat(*args[1:])
+        level = 100
+        if args and can_int(args[0]):
+            level, args = self.read_level(args[0]), args[1:]
+        team = self.read_team(args)
+        stats = pk.final_stats([g.base_stats for g in team], level, iv=31)
+        return await ball_emol().send(
+            self.ctx, f"Stats at level {level}", footer="Neutral nature, 31 IVs, no EVs.",
+            d=" ／ ".join(statLabels[:6]), fs={
+                g.full_name: " ／ ".join(str(k) for k in j) + f" ({sum(j)})" for g, j in zip(team, stats.tolist())
+            }
+        )
+
+    async def rank_stat(self, *args):
+        if not args or args[0].lower() not in statAliases:
+            raise commands.CommandError("Rank by which stat? (hp, atk, def, spa, spd, spe, or total)")
+        stat = statAliases[args[0].lower()]
+        level = self.read_level(args[1]) if len(args) > 1 else 100
+        return await Navigator(
+            ball_emol(), [f"**{n + 1}.** {g} ({j})" for n, (g, j) in enumerate(pk.stat_ranking(stat, level, iv=31))],
+            15, f"Highest {statLabels[stat]} at level {level} [{{page}}/{{pgs}}]",
+            footer="Neutral nature, 31 IVs, no EVs."
+        ).run(self.ctx)
+
     async def _test(self, *args):
         stat = pk.StatChange(1, {g: randrange(-3, 4) for g in pk.StatChange.stat_name_dict})
         mon = find_mon("Pikachu")
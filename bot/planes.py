@@ -1,23 +1,119 @@
 from epitaph import *
 from minigames import planes as pn
-from math import sin, cos
+from math import sin, cos, isfinite
+from heapq import heappop, heappush
 import datetime
+import traceback
+
+
+class FlightScheduler:
+    """Every plane in the air, as one heap of (time of next stop, order, user ID, plane, path) events, worked through
+    by a single task. After downtime, overdue stops are all handled in time order as soon as it starts."""
+
+    def __init__(self):
+        self.events = []
+        self.count = 0  # keeps events with the same ETA in the order they were added
+        self.wake = asyncio.Event()
+        self.delivered = {}  # {id(plane): credits delivered so far on this flight}
+        self.notify = {}  # {id(plane): (destination, mention)} for planes launched since startup
+
+    def schedule(self, user: pn.User, craft: pn.Plane):
+        if len(craft.path) > 0:
+            heappush(self.events, (craft.next_eta, self.count, user.id, craft, str(craft.path)))
+            self.count += 1
+            self.wake.set()
+
+    def launch(self, user: pn.User, craft: pn.Plane, dest: commands.Context, mention: str):
+        self.delivered[id(craft)] = 0
+        self.notify[id(craft)] = dest, mention
+        self.schedule(user, craft)
+
+    def load(self):
+        for user in zeph.planeUsers.values():
+            for craft in user.planes.values():
+                self.schedule(user, craft)
+
+    def forget(self, craft: pn.Plane):  # so a later plane that gets the same id() doesn't inherit these
+        self.delivered.pop(id(craft), None)
+        self.notify.pop(id(craft), None)
+
+    def arrive(self, user: pn.User, craft: pn.Plane):
+        self.delivered[id(craft)] = self.delivered.get(id(craft), 0) + user.arrive(craft)
+        zeph.planeStore.mark(user.id)
+        if len(craft.path) > 0:
+            return self.schedule(user, craft)
+        delivered = self.delivered.pop(id(craft), 0)
+        if id(craft) in self.notify:
+            dest, mention = self.notify.pop(id(craft))
+            job_str = f" and delivered Ȼ{pn.addcomm(delivered)} in jobs" if delivered else ""
+            zeph.loop.create_task(
+                self.announce(dest, f"{craft.name} arrived at {craft.path[-1].name}{job_str}!", mention)
+            )
+
+    def force_land(self, user: pn.User, craft: pn.Plane):  # ends the flight wherever it's gotten to
+        craft.path = pn.Path(int(time.time()), craft.path[0])
+        zeph.planeStore.mark(user.id)
+        self.forget(craft)
+
+    @staticmethod
+    async def announce(dest: commands.Context, s: str, mention: str):
+        try:
+            await plane.send(dest, s, d=mention)
+        except discord.HTTPException:
+            pass
+
+    async def run(self):
+        while True:
+            while self.events and self.events[0][0] <= time.time():
+                eta, count, user, craft, path = heappop(self.events)
+                user = zeph.planeUsers.get(user)
+                # skip events for planes that have since been sold or relaunched
+                if user is None or not any(g is craft for g in user.planes.values()):
+                    self.forget(craft)
+                    continue
+                if str(craft.path) != path:
+                    continue
+                try:
+                    self.arrive(user, craft)
+                except Exception:  # one bad plane shouldn't ground everyone else's
+                    traceback.print_exc()
+                    self.force_land(user, craft)
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.events[0][0] - time.time() if self.events else None)
+            except asyncio.TimeoutError:
+                pass
+
+
+scheduler = FlightScheduler()
 
 
 async def initialize_planes():
     print("Initializing planes...")
     start = time.time()
-    for i in re.findall(pn.pattern, pn.readurl(pn.url)):
-        pn.City.from_html(i)
+    try:
+        pn.load_snapshot()
+    except FileNotFoundError:  # first run; build the snapshot from the source
+        print("No city snapshot found. Fetching cities...")
+        try:
+            html = await pn.readurl(pn.url)
+        except pn.web.FetchError:
+            return print("Initialization failed.")
+        for i in pn.parse_cities(html):
+            pn.City.from_entry(i)
+        if len(pn.cities) != 0:
+            pn.write_snapshot([g.entry for g in pn.cities.values()])
     if len(pn.cities) == 0:
         return print("Initialization failed.")
+    pn.get_table()
     for i in pn.cities.values():
         if i.country not in pn.countries:
             pn.Country.from_name_only(i.country)
-    with open("storage/planes.txt", "r") as read:
-        for i in read.readlines():
-            us = pn.User.from_str(i)
-            zeph.planeUsers[us.id] = us
+    for i in zeph.planeStore.read():
+        us = pn.User.from_str(i)
+        zeph.planeUsers[us.id] = us
+    scheduler.load()
+    zeph.loop.create_task(scheduler.run())
     return print(f"Planes initialized. ({round(time.time() - start, 1)} s)")
 
 
@@ -62,6 +158,13 @@ async def planes(ctx: commands.Context, func: str = None, *args: str):
 class PlanesInterpreter(Interpreter):
     redirects = {"offload": "unload", "city": "airport"}
 
+    async def run(self, func: str, *args):
+        try:
+            return await super().run(func, *args)
+        finally:  # anything a command does to a user gets written to the database on the next save
+            if self.au.id in zeph.planeUsers:
+                zeph.planeStore.mark(self.au.id)
+
     @property
     def user(self):
         try:
@@ -111,46 +214,21 @@ class PlanesInterpreter(Interpreter):
 
         return {g.name.lower(): round(g.cost + 0.1 * g.cost * pre(g)) for g in pn.craft.values()}
 
+    def range_hint(self, craft: pn.Plane, fro: pn.City, to: pn.City):  # owned stopovers in range, closest to TO first
+        stops = [g for g, d in pn.get_table().within(fro, craft.range) if g.name in self.user.cities]
+        stops = sorted(stops, key=lambda c: c.dist(to))[:3]
+        return f" Try stopping at {', '.join(g.name for g in stops)} first." if stops else ""
+
     def plane_value(self, craft: pn.Plane):
         return self.model_prices[craft.model.lower()] + int(10000 * (2 ** sum(craft.upgrades + [1]) - 1))
 
-    def next_stop(self, craft: pn.Plane):
-        craft.path.iterate(craft.travel(craft.path[0], craft.path[1]))
-        ret = 0
-        jobs = [g for g in craft.jobs]
-        for i in jobs:
-            job = pn.Job.from_str(i)
-            if job.destination == craft.path[0]:
-                craft.unload(i)
-                self.user.credits += job.pay
-                ret += job.pay
-        return ret
-
-    async def arrival_timer(self, craft: pn.Plane):
-        delivered = 0
-        while len(craft.path) > 0:
-            await asyncio.sleep(craft.travel(craft.path[0], craft.path[1]))
-            delivered += self.next_stop(craft)
-
-        job_str = f" and delivered Ȼ{pn.addcomm(delivered)} in jobs" if delivered else ""
-        return await plane.send(
-            self.ctx, f"{craft.name} arrived at {craft.path[-1].name}{job_str}!", d=self.au.mention
-        )
-
     def filter_jobs(self, city: pn.City, fil: callable):
-        tm = time.time()
-        if tm - city.job_reset >= 900:
-            print(f"generating jobs for {city.name}")
-            city.rpj()
         gen = [g for g in city.jobs if g.code not in self.user.jobs and fil(g)]
         gen = [f"**``[{g.code}]``**  {self.oc(g.destination, True)}  (Ȼ{g.pay})" for g in gen]
-        reset = tm // 900 * 900
-        if tm - city.job_reset >= 900:
-            city.job_reset = reset
-        return {
-            "table": gen,
-            "footer": f"new jobs in {self.form_et(((tm // 900 + 1) * 900 - tm) // 60)} min"
-        }
+        return {"table": gen, "footer": self.job_footer(city)}
+
+    def job_footer(self, city: pn.City):
+        return f"next new job in {self.form_et((city.next_job - time.time()) // 60)} min"
 
     async def before_run(self):
         if self.au.id not in zeph.planeUsers:
@@ -183,16 +261,11 @@ class PlanesInterpreter(Interpreter):
                             break
                         await plane.send(self.ctx, "That's not a recognized city.")
 
-        if self.au.id in zeph.planeUsers:
-            for craft in self.user.planes.values():  # kinda messy; should only be called if zeph went down
-                if len(craft.path) > 0:              # while a plane was in the air
-                    while craft.next_eta and craft.next_eta < time.time():
-                        self.next_stop(craft)
-
     async def _help(self, *args):
         help_dict = {
             "map": "``z!planes map`` links to the airport map.",
             "profile": "``z!planes profile`` shows your country licenses and credit balance.",
+            "leaderboard": "``z!planes leaderboard`` lists the ten richest airlines.",
             "fleet": "``z!planes fleet`` lists your owned planes.\n"
                      "``z!planes fleet <plane>`` shows specs for a specific plane.\n"
                      "``z!planes fleet sell <plane>`` sells a plane for 25% of its purchase value, including "
@@ -216,9 +289,15 @@ class PlanesInterpreter(Interpreter):
                       "``z!planes launch meadowlark washington newyork boston`` will tell Meadowlark to "
                       "follow the path from its current location to Washington, then NewYork, then Boston, "
                       "without stopping. Planes will automatically unload jobs along the way.",
+            "nearby": "``z!planes nearby <airport>`` lists the ten airports closest to an airport.\n"
+                      "``z!planes nearby <airport> <km>`` lists all airports within that distance of it.",
+            "route": "``z!planes route <plane> <airport>`` finds the cheapest path your plane can fly to an airport, "
+                     "stopping only at airports you own, and gives the ``launch`` command to fly it.",
             "fuel": "``z!planes fuel`` shows the day's fuel prices. Prices change at midnight UTC.",
             "load": "``z!planes load <plane> <job codes>`` loads jobs onto a plane. The job code is the "
                     "five-letter/number code on the left side of a job list.",
+            "optimize": "``z!planes optimize <plane> <airports>`` picks the best-paying jobs to load onto a plane "
+                        "for a flight along a path, and gives the ``load`` command to load them.",
             "unload": "``z!planes unload <plane> <job codes>`` unloads jobs from a plane without pay, "
                       "returning it to its original source.",
             "rename": "``z!planes rename <plane> <new name>`` renames plane. Names can only contain "
@@ -269,6 +348,19 @@ class PlanesInterpreter(Interpreter):
                 "Airline Value": f"Ȼ{pn.addcomm(val)}"}
         )
 
+    async def _leaderboard(self, *args):
+        zeph.planeStore.save(zeph.planeUsers)  # so the table's up to date
+        ranks = zeph.db.richest_plane_users()
+
+        def name(no: int):
+            user = zeph.get_user(no)
+            return user.name if user else str(no)
+
+        return await plane.send(
+            self.ctx, "Richest Airlines",
+            d="\n".join(f"**{n + 1}.** {name(g[0])} - Ȼ{pn.addcomm(g[1])}" for n, g in enumerate(ranks)) or "none"
+        )
+
     async def _fleet(self, *args):
         if len(args) == 0:
             return await plane.send(
@@ -338,8 +430,7 @@ class PlanesInterpreter(Interpreter):
 
             return await plane.send(self.ctx, "Purchase cancelled.")
 
-        owned = len([g for g in pn.cities.values() if g.country == country.name
-                     and g.name in self.user.cities])
+        owned = len([g for g in pn.get_table().in_country(country.name) if g.name in self.user.cities])
         return await plane.send(
             self.ctx, country.name, same_line=True,
             fs={"Traffic": pn.suff(sum([g.passengers for g in country.cities])),
@@ -396,7 +487,7 @@ class PlanesInterpreter(Interpreter):
             fs={**city.dict, "Owned": ["No", "Yes"][city.name in self.user.cities]}, same_line=True
         )
 
-    async def _launch(self, *args):
+    def read_path(self, args: tuple):  # (plane, [its airport, *stops]) from a launch-style <plane> <city...>
         if len(args) == 0:
             raise commands.CommandError("What plane?")
         if len(args) == 1:
@@ -404,25 +495,30 @@ class PlanesInterpreter(Interpreter):
         if args[0].lower() not in self.user.planes:
             raise commands.CommandError("That's not a plane you own.")
 
-        craft, args = self.user.planes[args[0].lower()], args[1:]
+        craft = self.user.planes[args[0].lower()]
         if len(craft.path) != 0:
             raise commands.CommandError("That plane is currently in the air.")
-        for arg in args:
+        stops = []
+        for arg in args[1:]:
             try:
-                city = pn.find_city(arg)
+                stops.append(pn.find_city(arg))
             except KeyError:
                 raise commands.CommandError(self.invalid_city(arg))
-            if city.name not in self.user.cities:
-                raise commands.CommandError("You don't have the license to {}.".format(city.name))
-
-        args = [pn.find_city(g) for g in args]
-        path = [craft.path[0], *args]
-        fuel_cost = 0
+            if stops[-1].name not in self.user.cities:
+                raise commands.CommandError("You don't have the license to {}.".format(stops[-1].name))
 
+        path = [craft.path[0], *stops]
         for i in range(len(path) - 1):
             if path[i].dist(path[i + 1]) > craft.range:
-                raise commands.CommandError(f"{craft.name} can't reach {path[i + 1].name} from {path[i].name}.")
+                raise commands.CommandError(f"{craft.name} can't reach {path[i + 1].name} from {path[i].name}."
+                                            + self.range_hint(craft, path[i], path[i + 1]))
+        return craft, path
 
+    async def _launch(self, *args):
+        craft, path = self.read_path(args)
+        args = path[1:]
+        fuel_cost = 0
+        for i in range(len(path) - 1):
             fuel_cost += round(craft.lpk * path[i].dist(path[i + 1]) * self.fuel_price, 2)
 
         if round(fuel_cost) > self.user.credits:
@@ -434,12 +530,71 @@ class PlanesInterpreter(Interpreter):
             self.form_dt(datetime.datetime.fromtimestamp(craft.arrival)),
             f"{craft.name}+to+{craft.path[-1].name}"
         )
-        zeph.loop.create_task(self.arrival_timer(craft))
+        scheduler.launch(self.user, craft, self.ctx, self.au.mention)
         return await plane.send(
             self.ctx, "ETA: {}".format(pn.hrmin(craft.arrival - time.time())),
             d=f"Fuel cost: Ȼ{round(fuel_cost)}", url=url
         )
 
+    async def _nearby(self, *args):
+        if len(args) == 0:
+            return await plane.send(self.ctx, "no city input")
+        try:
+            city = pn.find_city(args[0])
+        except KeyError:
+            raise commands.CommandError(self.invalid_city(args[0]))
+
+        if len(args) > 1:
+            try:
+                radius = float(args[1])
+            except ValueError:
+                raise commands.CommandError("invalid distance")
+            if not (isfinite(radius) and radius > 0):
+                raise commands.CommandError("invalid distance")
+            near = pn.get_table().within(city, radius)
+            title = f"Airports within {pn.addcomm(round(radius))} km of {city.name}"
+        else:
+            near = pn.get_table().nearest(city, 10)
+            title = f"Airports nearest to {city.name}"
+        if not near:
+            return await plane.send(self.ctx, "No airports within that distance.")
+        return await Navigator(
+            plane, [f"{self.oc(g, True)} ({pn.addcomm(round(d))} km)" for g, d in near], 10, title + " [{page}/{pgs}]"
+        ).run(self.ctx)
+
+    async def _route(self, *args):
+        if len(args) == 0:
+            raise commands.CommandError("What plane?")
+        if len(args) == 1:
+            raise commands.CommandError("To where?")
+        if args[0].lower() not in self.user.planes:
+            raise commands.CommandError("That's not a plane you own.")
+
+        craft = self.user.planes[args[0].lower()]
+        if len(craft.path) != 0:
+            raise commands.CommandError("That plane is currently in the air.")
+        try:
+            to = pn.find_city(args[1])
+        except KeyError:
+            raise commands.CommandError(self.invalid_city(args[1]))
+        if to.name not in self.user.cities:
+            raise commands.CommandError("You don't have the license to {}.".format(to.name))
+        if to == craft.path[0]:
+            raise commands.CommandError(f"{craft.name} is already in {to.name}.")
+
+        route = pn.plan_route(craft.path[0], to, craft.range, [pn.cities[g.lower()] for g in self.user.cities])
+        if route is None:
+            raise commands.CommandError(f"{craft.name} can't reach {to.name} through airports you own.")
+        path = [craft.path[0], *route]
+        dist = sum(path[i].dist(path[i + 1]) for i in range(len(route)))
+        fuel_cost = sum(round(craft.lpk * path[i].dist(path[i + 1]) * self.fuel_price, 2) for i in range(len(route)))
+        return await plane.send(
+            self.ctx, f"{craft.name}: {craft.path[0].name} to {to.name}", same_line=True,
+            d=f"``z!planes launch {craft.name.lower()} {' '.join(g.name.lower() for g in route)}``",
+            fs={"Stops": " → ".join(g.name for g in route), "Distance": f"{pn.addcomm(round(dist))} km",
+                "Fuel Cost": f"Ȼ{pn.addcomm(round(fuel_cost))}"}
+        )
+
     async def _model(self, *args):
         if len(args) == 0:
             raise commands.CommandError("What model?")
@@ -485,7 +640,7 @@ class PlanesInterpreter(Interpreter):
         except KeyError:
             raise commands.CommandError(self.invalid_city(args[0]))
 
-        pri = sorted([g for g in pn.cities.values()], key=lambda x: -pn.priority(city, x))
+        pri = pn.get_table().ranked(city)
         if len(args) != 1:
             try:
                 to = pn.find_city(args[1])
@@ -512,11 +667,6 @@ class PlanesInterpreter(Interpreter):
         except KeyError:
             raise commands.CommandError(self.invalid_city(args[0]))
 
-        tm = time.time()
-        if tm - city.job_reset >= 900 or len(city.jobs) == 0:
-            print(f"generating jobs for {city.name}")
-            city.rpj()  # only rpj city when called
-
         fil = lambda j: j.destination.name in self.user.cities
         fil_str = "J"
         if len(args) > 1 and args[1].lower() == "all":
@@ -536,14 +686,7 @@ class PlanesInterpreter(Interpreter):
                 except KeyError:
                     raise commands.CommandError("invalid location")
 
-        reset = tm // 900 * 900
-        if tm - city.job_reset >= 900:
-            city.job_reset = reset
-
-        await JobNavigator(
-            self, city, fil, fil_str,
-            footer=f"new jobs in {self.form_et(((tm // 900 + 1) * 900 - tm) // 60)} min"
-        ).run(self.ctx)
+        await JobNavigator(self, city, fil, fil_str).run(self.ctx)
 
     async def _load(self, *args):
         if len(args) == 0:
@@ -582,6 +725,19 @@ class PlanesInterpreter(Interpreter):
 
         return await succ.send(self.ctx, "Job loaded." if len(jobs) == 1 else "Jobs loaded.")
 
+    async def _optimize(self, *args):
+        craft, path = self.read_path(args)
+        city = craft.path[0]
+        jobs = pn.best_jobs([g for g in city.jobs if g.code not in self.user.jobs], path[1:],
+                            craft.pass_cap - len(craft.jobs))
+        if len(jobs) == 0:
+            return await plane.send(self.ctx, "No jobs available for that path.")
+        return await plane.send(
+            self.ctx, f"Best jobs for {craft.name}", footer=f"Total pay: Ȼ{pn.addcomm(sum(g.pay for g in jobs))}",
+            d="\n".join(f"**``[{g.code}]``**  {self.oc(g.destination, True)}  (Ȼ{g.pay})" for g in jobs) +
+              f"\n\n``z!planes load {craft.name.lower()} {' '.join(g.code for g in jobs)}``"
+        )
+
     async def _rename(self, *args):
         if len(args) == 0:
             raise commands.CommandError("no plane input")
@@ -738,8 +894,7 @@ class PlanesInterpreter(Interpreter):
         except KeyError:
             raise commands.CommandError("invalid country")
 
-        ret = [g for g in pn.cities.values() if g.country == country
-               and g.name not in self.user.cities]
+        ret = [g for g in pn.get_table().in_country(country) if g.name not in self.user.cities]
         cost = int(sum([g.value for g in ret]))
         ret = [f"{g.name} (Ȼ{pn.addcomm(g.value)})" for g in sorted(ret, key=lambda c: c.value, reverse=True)]
 
@@ -840,6 +995,7 @@ class PlanesInterpreter(Interpreter):
             mess = await plane.send(self.ctx, "Alright, one moment...")
             await asyncio.sleep(2 + random() * 2)
             del zeph.planeUsers[self.au.id]
+            zeph.planeStore.mark(self.au.id)
             return await succ.edit(mess, "Done.", d="Call any ``z!planes`` function to start anew.")
 
 
@@ -0,0 +1,116 @@
+import json
+import numpy as np
+from os import path
+from pokemon.moves import types
+
+
+sources = {"stats": "pokemon/stats.json", "entries": "pokemon/dex.json", "species": "pokemon/species.json"}
+compiledPath = "pokemon/dex.npz"
+compiledVersion = 1
+
+
+def build(out: str = compiledPath):
+    """Compiles the JSON files into one .npz: one row per form for stats, types and sizes, and every species' dex
+    entries encoded end to end in a single blob, with offsets to find each one."""
+    with open(sources["stats"], "r", encoding="utf8") as r:
+        stats = json.load(r)
+    with open(sources["entries"], "r", encoding="utf8") as r:
+        entries = json.load(r)
+    with open(sources["species"], "r", encoding="utf8") as r:
+        categories = json.load(r)
+    names = list(stats)
+    forms = [(n, k) for n, g in enumerate(names) for k in stats[g][1:]]
+    blob, offsets = bytearray(), [0]
+    for name in names:  # dex.json spells Flabébé without the accents
+        blob += json.dumps(entries.get(name, entries.get(name.replace("é", "e"), {})), ensure_ascii=False)\
+            .encode("utf8")
+        offsets.append(len(blob))
+    np.savez(
+        out, version=np.array(compiledVersion), names=np.array(names),
+        categories=np.array([categories.get(g, "") for g in names]),
+        species=np.array([n for n, k in forms], dtype=np.int16),
+        forms=np.array([k[10] for n, k in forms]),
+        stats=np.array([k[:6] for n, k in forms], dtype=np.int16),
+        types=np.array([[types.index(k[6]), types.index(k[7]) if k[7] else -1] for n, k in forms], dtype=np.int8),
+        sizes=np.array([k[8:10] for n, k in forms], dtype=float),
+        entries=np.frombuffer(bytes(blob), dtype=np.uint8), offsets=np.array(offsets, dtype=np.int64)
+    )
+
+
+def stale(file: str = compiledPath):
+    return not path.exists(file) or any(path.getmtime(g) > path.getmtime(file) for g in sources.values())
+
+
+class CompiledDex:
+    """The compiled Pokédex. Stats and types are read in whole columns; entries are left in the blob, and only
+    decoded for the species that are actually looked up."""
+
+    def __init__(self, file: str = compiledPath):
+        with np.load(file) as data:
+            self.version = int(data["version"])
+            self.names = data["names"].tolist()
+            self.categories = data["categories"].tolist()
+            self.species = data["species"]
+            self.formNames = data["forms"].tolist()
+            self.stats = data["stats"]
+            self.types = data["types"]
+            self.sizes = data["sizes"]
+            self.offsets = data["offsets"]
+        self.file = file
+        self.blob = None
+        self.number = {g: n for n, g in enumerate(self.names)}
+        self.formsOf = [[] for g in self.names]
+        for n, g in enumerate(self.species.tolist()):
+            self.formsOf[g].append(n)
+
+    def form_row(self, n: int):  # the same list stats.json holds for each form
+        type1, type2 = self.types[n].tolist()
+        return [*self.stats[n].tolist(), types[type1], types[type2] if type2 >= 0 else None,
+                *self.sizes[n].tolist(), self.formNames[n]]
+
+    def entry(self, no: int):
+        if self.blob is None:
+            with np.load(self.file) as data:
+                self.blob = data["entries"].tobytes()
+        return json.loads(self.blob[self.offsets[no]:self.offsets[no + 1]].decode("utf8"))
+
+
+class DexEntries:
+    """{species: {game: entry}}, decoded one species at a time."""
+
+    def __init__(self, dex: CompiledDex):
+        self.dex = dex
+        self.decoded = {}
+
+    def __getitem__(self, item: str):
+        if item not in self.decoded:
+            self.decoded[item] = self.dex.entry(self.dex.number[item])
+        return self.decoded[item]
+
+    def __contains__(self, item):
+        return item in self.dex.number
+
+    def __iter__(self):
+        return iter(self.dex.names)
+
+    def __len__(self):
+        return len(self.dex.names)
+
+    def get(self, item, default=None):
+        return self[item] if item in self else default
+
+
+def load(file: str = compiledPath):
+    """Rebuilds the compiled dex first if it's missing, out of date, or from an older version of the format."""
+    if stale(file):
+        build(file)
+    ret = CompiledDex(file)
+    if ret.version != compiledVersion:
+        build(file)
+        ret = CompiledDex(file)
+    return ret
+
+
+if __name__ == "__main__":  # python -m pokemon.dexfile, from the bot directory
+    build()
+    print(f"Compiled {len(CompiledDex().names)} species to {compiledPath}.")
@@ -1,13 +1,20 @@
 import json
 import random
+import numpy as np
 from pokemon.moves import *
+from pokemon import dexfile
 from re import sub
 from typing import Union
 from pyquery import PyQuery
 from math import floor
+from bisect import bisect_left
+from time import time
+from utilities.assets import LazyAsset
 
 
 class Form:
+    __slots__ = "hp", "atk", "dfn", "spa", "spd", "spe", "type1", "type2", "height", "weight", "name"
+
     def __init__(self, hp: int, atk: int, dfn: int, spa: int, spd: int, spe: int, type1, type2,
                  height: float, weight: float, name: str = ""):
         self.hp = hp
@@ -67,6 +74,28 @@ class Species:
         return [self.name, *[g.json for g in self.forms.values()]]
 
 
+def full_name(spc: str, form: str):
+    if not form:
+        return spc
+    if form in formes:
+        return f"{spc} ({form} Forme)"
+    elif spc == "Vivillon":
+        return f"{spc} ({form} Pattern)"
+    elif spc in ["Flabébé", "Floette", "Florges"]:
+        return f"{spc} ({form} Flower)"
+    elif spc == "Oricorio":
+        return f"{spc} ({form} Style)"
+    elif spc in ["Pumpkaboo", "Gourgeist"]:
+        return f"{form} Size {spc}"
+    elif spc == "Wormadam":
+        return f"{form} Cloak {spc}"
+    elif spc in ["Silvally", "Arceus"]:
+        return f"{spc} ({form}-type)"
+    elif spc == "Furfrou":
+        return f"{spc} ({form} Trim)"
+    return formAts.get(form, "{} (" + form + " Form)").format(spc)
+
+
 natures = [
     'Hardy', 'Lonely', 'Adamant', 'Naughty', 'Brave',
     'Bold', 'Docile', 'Impish', 'Lax', 'Relaxed',
@@ -74,6 +103,29 @@ natures = [
     'Calm', 'Gentle', 'Careful', 'Quirky', 'Sassy',
     'Timid', 'Hasty', 'Jolly', 'Naive', 'Serious'
 ]
+statNames = ["hp", "atk", "dfn", "spa", "spd", "spe"]
+natureMods = np.array([[1 + 0.1 * (n // 5 == g) - 0.1 * (n % 5 == g) for g in range(5)] for n in range(25)])
+
+
+def final_stats(base, level=100, nature=0, iv=0, ev=0):
+    """The same numbers as Mon's stat properties (before stat stages), for a whole batch of mons at once. BASE is an
+    (n, 6) array of base stats. LEVEL and NATURE (an index in natures) can be one value or one per mon; IV and EV can
+    also be one per stat, or an (n, 6) array. Returns an (n, 6) array."""
+    base = np.asarray(base, dtype=int).reshape(-1, 6)
+    level = np.asarray(level, dtype=int).reshape(-1, 1)
+    raw = (2 * base + np.asarray(iv, dtype=int) + np.asarray(ev, dtype=int) // 4) * level // 100
+    others = np.floor((raw[:, 1:] + 5) * natureMods[np.asarray(nature, dtype=int).reshape(-1)]).astype(int)
+    return np.hstack([raw[:, :1] + level + 10, others])
+
+
+def stat_ranking(stat: int, level: int = 100, nature: int = 0, iv=0, ev=0):
+    """Every form of every species, highest STAT (an index in statNames, or 6 for the total) first, as
+    [(full name, stat)]."""
+    stats = final_stats(formBases, level, nature, iv, ev)
+    values = stats.sum(axis=1) if stat == len(statNames) else stats[:, stat]
+    order = np.argsort(-values, kind="stable").tolist()
+    values = values.tolist()
+    return [(formFullNames[g], values[g]) for g in order]
 
 
 class Mon:
@@ -104,11 +156,11 @@ class Mon:
 
     @property
     def dex_no(self):
-        return list(natDex).index(self.species.name) + 1
+        return dexNumbers[self.species.name]
 
     @property
     def generation(self):
-        return [g for g in range(8) if self.dex_no <= generationBounds[g]][-1]
+        return bisect_left(generationBounds, self.dex_no)
 
     @property
     def bulbapedia(self):
@@ -124,7 +176,7 @@ class Mon:
 
     @property
     def form_names(self):
-        return [Mon(self.species, form=g).full_name for g in natDex[self.species.name].forms]
+        return formNames[self.species.name]
 
     @property
     def types(self):
@@ -148,25 +200,7 @@ class Mon:
 
     @property
     def full_name(self):
-        if not self.form.name:
-            return self.species.name
-        if self.form.name in formes:
-            return f"{self.species.name} ({self.form.name} Forme)"
-        elif self.species.name == "Vivillon":
-            return f"{self.species.name} ({self.form.name} Pattern)"
-        elif self.species.name in ["Flabébé", "Floette", "Florges"]:
-            return f"{self.species.name} ({self.form.name} Flower)"
-        elif self.species.name == "Oricorio":
-            return f"{self.species.name} ({self.form.name} Style)"
-        elif self.species.name in ["Pumpkaboo", "Gourgeist"]:
-            return f"{self.form.name} Size {self.species.name}"
-        elif self.species.name == "Wormadam":
-            return f"{self.form.name} Cloak {self.species.name}"
-        elif self.species.name in ["Silvally", "Arceus"]:
-            return f"{self.species.name} ({self.form.name}-type)"
-        elif self.species.name == "Furfrou":
-            return f"{self.species.name} ({self.form.name} Trim)"
-        return formAts.get(self.form.name, "{} (" + self.form.name + " Form)").format(self.species.name)
+        return full_name(self.species.name, self.form.name)
 
     @property
     def ni(self):
@@ -246,7 +280,7 @@ class Mon:
         return self.stat_level("acc")
 
     def eff(self, typ: str):
-        return effectiveness[typ].get(self.type1, 1) * effectiveness[typ].get(self.type2, 1)
+        return float(effTensor[typeIndex[typ], typeIndex[self.type1], typeIndex[self.type2]])
 
     def apply(self, stat: Union[StatChange, StatusEffect]):
         ret = {}
@@ -263,20 +297,40 @@ class Mon:
         return ret
 
 
-with open("stats.json" if __name__ == "__main__" else "pokemon/stats.json", "r") as file:
-    natDex = {g: Species(j[0], *[Form(*k) for k in j[1:]]) for g, j in json.load(file).items()}
-
-
-with open("dex.json" if __name__ == "__main__" else "pokemon/dex.json", "r") as file:
-    dexEntries = json.load(file)
+dexData = dexfile.load()
+natDex = {
+    g: Species(g, *[Form(*dexData.form_row(k)) for k in dexData.formsOf[n]]) for n, g in enumerate(dexData.names)
+}
+dexEntries = LazyAsset("pok\u00e9dex entries", lambda: dexfile.DexEntries(dexData))
+species = dict(zip(dexData.names, dexData.categories))
+dexNumbers = {g: n + 1 for n, g in enumerate(natDex)}
+formNames = {g: [full_name(g, k) for k in j.forms] for g, j in natDex.items()}
+formBases = dexData.stats.astype(int)  # one row per form, every species' forms in dex order
+formFullNames = [full_name(dexData.names[g], k) for g, k in zip(dexData.species.tolist(), dexData.formNames)]
 
 
-with open("species.json" if __name__ == "__main__" else "pokemon/species.json", "r") as file:
-    species = json.load(file)
+with open("pokemon/eff.json", "r") as file:
+    effectiveness = json.load(file)
+typeIndex = {**{g: n for n, g in enumerate(types)}, None: len(types)}  # the extra index is for no second type
+effMatrix = np.array([[effectiveness[g].get(j, 1) for j in types] + [1] for g in types])  # attacking x defending
+effTensor = effMatrix[:, :, None] * effMatrix[:, None, :]  # attacking x type 1 x type 2
+effLabels = {4: "4x", 2: "2x", 1: "1x", 0.5: "1/2x", 0.25: "1/4x", 0: "0x"}
+effBuckets = {  # {(type 1, type 2): {label: "types, that, get, that"}}, for every pair of types
+    (g, j): {
+        label: ", ".join(types[n] for n in np.flatnonzero(effTensor[:, typeIndex[g], typeIndex[j]] == mult))
+        for label, mult in ((k, m) for m, k in effLabels.items())
+        if (effTensor[:, typeIndex[g], typeIndex[j]] == mult).any()
+    } for g in types for j in typeIndex
+}
 
 
-with open("eff.json" if __name__ == "__main__" else "pokemon/eff.json", "r") as file:
-    effectiveness = json.load(file)
+def coverage(team: list):
+    """Every attacking type, ranked by how hard it hits TEAM (a list of Mons): by how many of them it's super effective
+    against, then by its average multiplier. [(type, [multiplier against each member])]"""
+    idx = np.array([[typeIndex[g.type1], typeIndex[g.type2]] for g in team])
+    mults = effTensor[:, idx[:, 0], idx[:, 1]]
+    order = np.lexsort((-mults.mean(axis=1), -(mults > 1).sum(axis=1)))
+    return [(types[g], mults[g].tolist()) for g in order]
 
 
 def fix(s: str, joiner: str = "-"):
@@ -306,13 +360,14 @@ class Dex:
     def __init__(self, name: str):
         self.name = name
         self.dex = {g: j for g, j in list(natDex.items())[:generationBounds[gameGenerations[name]]]}
+        self.order = list(self.dex.values())
 
     def __len__(self):
         return len(self.dex)
 
     def __getitem__(self, item: Union[int, str]):
         if isinstance(item, int):
-            return self.dex[list(self.dex)[(item - 1) % len(self.dex)]]
+            return self.order[(item - 1) % len(self.order)]
         return self.dex[item]
 
     def __contains__(self, item):
@@ -346,3 +401,20 @@ for sp in natDex.values():
         for form in sp.forms.values():
             exemplaryMons[frozenset([form.type1, form.type2])] = \
                 exemplaryMons.get(frozenset([form.type1, form.type2]), []) + [f"{sp.name} {form.name}".strip()]
+
+
+def benchmark(pages: int = 2000):
+    """Flips through the Ultra Sun dex the way DexNavigator does, working out everything a page shows."""
+    dex = gameDexes["Ultra Sun"]
+    mon = Mon(dex[1])
+    start = time()
+    for i in range(pages):
+        mon = Mon(dex[mon.dex_no + 1])
+        page = (mon.dex_no, mon.full_name, mon.types, species[mon.species.name], mon.base_stats, mon.bulbapedia,
+                mon.serebii, mon.pokemondb, image(mon), mon.form_names.index(mon.full_name),
+                dexEntries[mon.species.name])
+    return f"{round(pages / (time() - start))} pages/s"
+
+
+if __name__ == "__main__":  # python -m pokemon.mons, from the bot directory
+    print(benchmark())
@@ -4,8 +4,12 @@ import inspect
 import json
 from discord.ext import commands
 from typing import Union
+from io import BytesIO
+from PIL import Image
 from minigames.risk import snip
-from utilities.words import levenshtein
+from utilities.words import FuzzyIndex
+from utilities import assets, workers
+from utilities.storage import Database, PlaneStore
 from math import ceil, atan2, sqrt, pi
 from random import choice
 import pinyin_jyutping_sentence as pjs
@@ -20,26 +24,37 @@ class Zeph(commands.Bot):
     def __init__(self):
         super().__init__("z!", case_insensitive=True)
         del self.all_commands["help"]
-        with open("storage/call_channels.txt", "r") as f:
-            self.phoneNumbers = {int(g.split("|")[0]): int(g.split("|")[1]) for g in f.readlines()}
-            self.callChannels = {int(g.split("|")[1]): int(g.split("|")[2]) for g in f.readlines()}
+        self.db = Database()
+        self.phoneNumbers = {g[0]: g[1] for g in self.db.phone_numbers()}
+        self.callChannels = {g[1]: g[2] for g in self.db.phone_numbers() if g[2] is not None}
         self.planeUsers = {}
+        self.planeStore = PlaneStore(self.db)
         self.bedtimes = {}
         self.roman = pjs.RomanizationConversion()
+        self._emojis = None
+        self._strings = None
+        for event in ("on_ready", "on_guild_available", "on_guild_join", "on_guild_remove", "on_guild_emojis_update"):
+            self.add_listener(self.forget_emojis, event)
 
     @property
-    def emojis(self):
-        return {g.name: g for g in self._connection.emojis}
+    def emojis(self):  # built on first use, and rebuilt only after the set of visible emojis changes
+        if self._emojis is None:
+            self._emojis = {g.name: g for g in self._connection.emojis}
+        return self._emojis
 
     @property
     def strings(self):
-        return {g: str(j) for g, j in self.emojis.items()}
+        if self._strings is None:
+            self._strings = {g: str(j) for g, j in self.emojis.items()}
+        return self._strings
+
+    async def forget_emojis(self, *args):
+        self._emojis = None
+        self._strings = None
 
     def save(self):
-        with open("storage/call_channels.txt", "w") as f:
-            f.write("\n".join([f"{g}|{j}|{self.callChannels.get(j, '')}" for g, j in self.phoneNumbers.items()]))
-        with open("storage/planes.txt", "w") as f:
-            f.write("\n".join([str(g) for g in self.planeUsers.values()]))
+        self.db.save_phone_numbers(self.phoneNumbers, self.callChannels)
+        self.planeStore.save(self.planeUsers)
 
     async def load_romanization(self):
         print("Loading romanizer...")
@@ -119,7 +134,8 @@ class Emol:  # fancy emote-color embeds
         return construct_embed(title=f"{self.emoji} \u2223 {s}" if s else None, col=self.color, **kwargs)
 
     async def send(self, destination: commands.Context, s: str = None, **kwargs):  # sends
-        return await destination.send(embed=self.con(s, **kwargs))
+        file = kwargs.pop("file", None)
+        return await destination.send(embed=self.con(s, **kwargs), file=file)
 
     async def edit(self, message: discord.Message, s: str = None, **kwargs):  # edits message
         return await message.edit(embed=self.con(s, **kwargs))
@@ -166,8 +182,23 @@ async def confirm(s: str, dest: Union[commands.Context, discord.TextChannel], ca
         return con.emoji == zeph.emojis["yes"]
 
 
-async def image_url(fp: str):
-    return (await zeph.get_channel(528460450069872642).send(file=discord.File(fp))).attachments[0].url
+@workers.offload
+def encode_png(img: Image.Image):  # big images take long enough to encode that it's kept off the event loop
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def image_file(img: Image.Image, filename: str = "image.png"):  # encodes into memory, ready to attach
+    return discord.File(BytesIO(await encode_png(img)), filename)
+
+
+def attachment(filename: str = "image.png"):  # for pointing an embed at a file sent alongside it
+    return f"attachment://{filename}"
+
+
+async def image_url(img: Image.Image):  # for embeds that get edited, since edits can't carry new attachments
+    return (await zeph.get_channel(528460450069872642).send(file=await image_file(img))).attachments[0].url
 
 
 def plural(s: str, n: Union[float, int], **kwargs):
@@ -456,9 +487,15 @@ def can_int(s: str):
     return True
 
 
+fuzzyIndexes = {}  # {id(corpus): (corpus, size when indexed, index)}
+
+
 def best_guess(target: str, l: iter):
-    di = {g: levenshtein(target, g.lower()) for g in l}
-    return choice([key for key in di if di[key] == min(list(di.values()))])
+    cached = fuzzyIndexes.get(id(l))
+    if cached is None or cached[0] is not l or cached[1] != len(l):
+        cached = fuzzyIndexes[id(l)] = l, len(l), FuzzyIndex(l)
+    matches = cached[2].closest(target)
+    return choice([g[1] for g in matches if g[0] == matches[0][0]])
 
 
 def two_digit(n: Flint):
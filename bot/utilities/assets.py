@@ -0,0 +1,57 @@
+from threading import Lock
+from time import time
+
+
+registry = {}
+
+
+class LazyAsset:
+    """Stands in for a chunk of game data that's expensive to build (images, big JSON files, word lists), and only
+    builds it the first time something actually asks for it. After that it's cached. Acts enough like the dict / list
+    it wraps that most code doesn't need to know the difference; use ``.value`` to get at the real thing. Safe to
+    touch from worker threads: only one of them builds it."""
+
+    def __init__(self, name: str, loader: callable):
+        self.name = name
+        self.loader = loader
+        self.loaded = False
+        self.load_time = 0
+        self._value = None
+        self.lock = Lock()
+        registry[name] = self
+
+    @property
+    def value(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    start = time()
+                    self._value = self.loader()
+                    self.load_time = time() - start
+                    self.loaded = True
+        return self._value
+
+    def __getitem__(self, item):
+        return self.value[item]
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __repr__(self):
+        return f"<LazyAsset {self.name} ({'loaded' if self.loaded else 'deferred'})>"
+
+    def get(self, item, default=None):
+        return self.value.get(item, default)
+
+
+def report():
+    deferred = [g.name for g in registry.values() if not g.loaded]
+    loaded = [f"{g.name} ({round(g.load_time, 2)} s)" for g in registry.values() if g.loaded]
+    return f"Deferred assets: {', '.join(deferred) if deferred else 'none'}\n" \
+           f"Loaded assets: {', '.join(loaded) if loaded else 'none'}"
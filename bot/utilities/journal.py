@@ -0,0 +1,19 @@
+from os import path
+
+
+def read_journaled(snapshot: str, key: callable):
+    """Reads the snapshot-plus-journal files the bot used to keep Planes users in, before the database: the latest
+    line for every record, with the journal (SNAPSHOT.journal) played over the snapshot. KEY gets a record's ID from
+    its line. A last journal line that was cut off mid-write is skipped."""
+    ret = {}
+    if path.exists(snapshot):
+        with open(snapshot, "r", encoding="utf8") as r:
+            for line in r.read().splitlines():
+                if line:
+                    ret[key(line)] = line
+    if path.exists(snapshot + ".journal"):
+        with open(snapshot + ".journal", "r", encoding="utf8") as r:
+            journal = r.read()
+        for line in journal[:journal.rfind("\n") + 1].splitlines():
+            ret[key(line)] = line
+    return list(ret.values())
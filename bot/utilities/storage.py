@@ -0,0 +1,117 @@
+import sqlite3
+from os import path
+from utilities.journal import read_journaled
+
+
+schemas = {  # one per subsystem
+    "planes": [
+        "CREATE TABLE IF NOT EXISTS planes_users (id INTEGER PRIMARY KEY, record TEXT NOT NULL, "
+        "credits INTEGER NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS planes_users_credits ON planes_users (credits DESC)"
+    ],
+    "phone": [
+        "CREATE TABLE IF NOT EXISTS phone_numbers (number INTEGER PRIMARY KEY, guild INTEGER NOT NULL, "
+        "channel INTEGER)"
+    ]
+}
+schemaVersion = 1
+legacyPlanes = "storage/planes.txt"
+legacyPhones = "storage/call_channels.txt"
+
+
+class Database:
+    """All of the bot's saved state, in one SQLite file. Tables are created on first connect, and the old text files
+    are imported into them the first time."""
+
+    def __init__(self, file: str = "storage/zephyrus.db"):
+        self.connection = sqlite3.connect(file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        with self.connection:
+            for statements in schemas.values():
+                for statement in statements:
+                    self.connection.execute(statement)
+        if version < schemaVersion:
+            migrate(self)
+            self.connection.execute(f"PRAGMA user_version={schemaVersion}")
+
+    def plane_users(self):
+        return [g[0] for g in self.connection.execute("SELECT record FROM planes_users ORDER BY id")]
+
+    def plane_user(self, no: int):
+        ret = self.connection.execute("SELECT record FROM planes_users WHERE id = ?", (no,)).fetchone()
+        return ret[0] if ret else None
+
+    def save_plane_users(self, users: iter):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO planes_users (id, record, credits) VALUES (?, ?, ?)",
+                [(g.id, str(g), round(g.credits)) for g in users]
+            )
+
+    def delete_plane_users(self, ids: iter):
+        with self.connection:
+            self.connection.executemany("DELETE FROM planes_users WHERE id = ?", [(g, ) for g in ids])
+
+    def richest_plane_users(self, n: int = 10):  # [(id, credits)]
+        return self.connection.execute(
+            "SELECT id, credits FROM planes_users ORDER BY credits DESC LIMIT ?", (n,)
+        ).fetchall()
+
+    def phone_numbers(self):  # [(number, guild, channel)]
+        return self.connection.execute("SELECT number, guild, channel FROM phone_numbers").fetchall()
+
+    def save_phone_numbers(self, numbers: dict, channels: dict):  # replaces the whole table, so removals stick
+        with self.connection:
+            self.connection.execute("DELETE FROM phone_numbers")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO phone_numbers (number, guild, channel) VALUES (?, ?, ?)",
+                [(g, j, channels.get(j)) for g, j in numbers.items()]
+            )
+
+
+class PlaneStore:
+    """Keeps track of which Planes users have changed, and writes just those users' rows on save."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.dirty = set()
+
+    def read(self):
+        return self.db.plane_users()
+
+    def mark(self, key: int):
+        self.dirty.add(key)
+
+    def save(self, records: dict):
+        changed = [records[g] for g in self.dirty if g in records]
+        deleted = [g for g in self.dirty if g not in records]
+        self.dirty.clear()
+        if changed:
+            self.db.save_plane_users(changed)
+        if deleted:
+            self.db.delete_plane_users(deleted)
+
+
+def migrate(db: Database):
+    """Imports planes.txt (and its journal) and call_channels.txt, if they're around. Rows that are already in the
+    database are left alone, since they're newer than anything in the text files."""
+    lines = read_journaled(legacyPlanes, lambda s: int(s.split("|")[0]))
+    with db.connection:
+        db.connection.executemany(
+            "INSERT OR IGNORE INTO planes_users (id, record, credits) VALUES (?, ?, ?)",
+            [(int(g.split("|")[0]), g, int(g.split("|")[4])) for g in lines]
+        )
+        if path.exists(legacyPhones):
+            with open(legacyPhones, "r") as r:
+                phones = [g.split("|") for g in r.read().splitlines() if g]
+            db.connection.executemany(
+                "INSERT OR IGNORE INTO phone_numbers (number, guild, channel) VALUES (?, ?, ?)",
+                [(int(g[0]), int(g[1]), int(g[2]) if len(g) > 2 and g[2] else None) for g in phones]
+            )
+    return len(lines)
+
+
+if __name__ == "__main__":  # python -m utilities.storage, from the bot directory, to import anything missing from the text files
+    print(f"Imported {migrate(Database())} Planes users.")
@@ -0,0 +1,60 @@
+import aiohttp
+import asyncio
+from utilities import workers
+
+
+timeout = aiohttp.ClientTimeout(total=20, connect=5)
+maxSize = 8 * 1024 * 1024  # bytes. anything bigger than this isn't worth holding in memory
+maxConnections = 32
+maxPerHost = 4  # so one slow site can't eat every connection in the pool
+session = None
+
+
+class FetchError(Exception):
+    def __init__(self, url: str, status: int = None, reason: str = None):
+        self.url = url
+        self.status = status
+        super().__init__(reason or f"{status} error fetching {url}")
+
+
+def get_session():
+    global session
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            timeout=timeout, connector=aiohttp.TCPConnector(limit=maxConnections, limit_per_host=maxPerHost)
+        )
+    return session
+
+
+async def fetch(url: str, params: dict = None, max_size: int = maxSize):
+    """Reads the body of URL without blocking the event loop. Raises FetchError on error statuses, timeouts, and
+    responses larger than MAX_SIZE."""
+    try:
+        async with get_session().get(url, params=params) as response:
+            if response.status >= 400:
+                raise FetchError(url, response.status)
+            if response.content_length is not None and response.content_length > max_size:
+                raise FetchError(url, reason=f"Response from {url} is too large.")
+            ret = await response.content.read(max_size + 1)
+            if len(ret) > max_size:
+                raise FetchError(url, reason=f"Response from {url} is too large.")
+            return ret
+    except asyncio.TimeoutError:
+        raise FetchError(url, reason=f"Timed out fetching {url}.")
+    except aiohttp.ClientError as e:
+        raise FetchError(url, reason=f"Couldn't fetch {url}: {e}")
+
+
+async def fetch_text(url: str, params: dict = None, max_size: int = maxSize):
+    return (await fetch(url, params, max_size)).decode("utf8", errors="replace")
+
+
+async def run_blocking(func: callable, *args, **kwargs):
+    """For client libraries that only come in synchronous flavors (googlemaps, googletrans). Runs them in the thread
+    pool so they only hold up the command that called them."""
+    return await workers.threads.run(func, *args, **kwargs)
+
+
+async def close():
+    if session is not None and not session.closed:
+        await session.close()
@@ -1,11 +1,12 @@
 from html.parser import HTMLParser
 from pyquery import PyQuery
+from utilities import web
 wikilink = "https://en.wikipedia.org/wiki/{}"
 wikiSearch = "https://en.wikipedia.org/w/index.php?search={}&title=Special%3ASearch&fulltext=1&limit=100"
 
 
-def readurl(url):
-    return str(PyQuery(url, {'title': 'CSS', 'printable': 'yes'}, encoding="utf8"))
+async def readurl(url):
+    return str(PyQuery(await web.fetch_text(url, {'title': 'CSS', 'printable': 'yes'})))
 
 
 def remove_paren(s: str):
@@ -104,7 +105,8 @@ class ForeignParser(HTMLParser):
 
 
 if __name__ == "__main__":
-    html = readurl(wikilink.format("asodijfaiosdjfoasidjfoaisjdf"))
+    import asyncio
+    html = asyncio.get_event_loop().run_until_complete(readurl(wikilink.format("asodijfaiosdjfoasidjfoaisjdf")))
     parser = ForeignParser()
     parser.feed(html)
     for lang, link in parser.lang_link.items():
@@ -1,8 +1,17 @@
-wordList = []
-with open("words.txt" if __name__ == '__main__' else "utilities/words.txt", "r") as r:
-    for l in r.readlines():
-        wordList.append(l[:-1])
-wordDict = {l: tuple(g for g in wordList if len(g) == l) for l in range(1, 23)}
+from utilities.assets import LazyAsset
+from itertools import combinations
+from hashlib import sha1
+from random import choice, sample
+from heapq import heappop, heappush
+
+
+def load_words():
+    with open("words.txt" if __name__ == '__main__' else "utilities/words.txt", "r") as r:
+        return [l[:-1] for l in r.readlines()]
+
+
+wordList = LazyAsset("word list", load_words)
+wordDict = LazyAsset("word lengths", lambda: {l: tuple(g for g in wordList if len(g) == l) for l in range(1, 23)})
 anagramsDist = [13, 5, 6, 7, 24, 6, 7, 6, 12, 2, 2, 8, 8, 11, 15, 4, 2, 12, 10, 10, 6, 2, 4, 2, 2, 2]
 anagramsDist = [g for sub in [[chr(j + 97)] * anagramsDist[j] for j in range(26)] for g in sub]
 
@@ -27,6 +36,76 @@ def levenshtein(s1, s2, insert_cost: int=1, delete_cost: int=1, sub_cost: int=1)
     return previous_row[-1]
 
 
+def bounded_levenshtein(s1, s2, bound: float):  # gives up and returns bound + 1 once the distance must exceed BOUND
+    if abs(len(s1) - len(s2)) > bound:
+        return bound + 1
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            current_row.append(min((previous_row[j + 1] + 1, current_row[j] + 1, previous_row[j] + (c1 != c2))))
+        if min(current_row) > bound:
+            return bound + 1
+        previous_row = current_row
+
+    return previous_row[-1]
+
+
+class FuzzyIndex:
+    """A BK-tree over a set of strings. Finds the strings closest to a typo while only measuring the distance to a
+    fraction of the set. Strings are compared by KEY (lowercase, by default), but reported as-is."""
+
+    def __init__(self, words: iter, key: callable = str.lower):
+        self.key = key
+        self.root = None  # nodes are [key, [words with that key], {distance: child node}]
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        key = self.key(word)
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [word], {}]
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(key, node[0])
+            if distance == 0:
+                return node[1].append(word)
+            if distance not in node[2]:
+                node[2][distance] = [key, [word], {}]
+                return
+            node = node[2][distance]
+
+    def closest(self, target: str, k: int = 1):
+        """The K closest strings to TARGET, plus any tied with the Kth, as sorted (distance, string) pairs."""
+        target = self.key(target)
+        found = []
+        radius = float("inf")
+        queue = [(0, 0, self.root)] if self.root else []  # (least possible distance, tiebreaker, node)
+        count = 1
+        while queue:
+            least, _, (key, words, children) = heappop(queue)
+            if least > radius:
+                break
+            distance = bounded_levenshtein(target, key, radius + max(children, default=0))
+            if distance <= radius:
+                found.extend((distance, g) for g in words)
+                if len(found) >= k:
+                    found.sort()
+                    radius = found[k - 1][0]
+                    found = [g for g in found if g[0] <= radius]
+            for edge, child in children.items():
+                if abs(distance - edge) <= radius:
+                    heappush(queue, (abs(distance - edge), count, child))
+                    count += 1
+        return sorted(found)
+
+
 def levpath(start, goal):
     if start[:len(goal)] == goal:
         return start[:len(goal)] + start[len(goal) + 1:]
@@ -55,8 +134,58 @@ def canform(word, lets):
     return False not in [word.count(c) <= lets.count(c) for c in word]
 
 
+def signature(word):  # two words are anagrams iff they have the same signature
+    return "".join(sorted(word))
+
+
+def build_anagram_index():
+    ret = {}
+    for word in wordList:
+        if len(word) >= 3:
+            ret.setdefault(signature(word), []).append(word)
+    return {g: tuple(j) for g, j in ret.items()}
+
+
+anagramIndex = LazyAsset("anagram index", build_anagram_index)
+
+
 def anagrams(word):
-    return [i for i in wordList if canform(i, word) and len(i) >= 3]
+    if len(word) > 12:  # too many sub-racks to list out; a straight scan is quicker
+        return [i for i in wordList if canform(i, word) and len(i) >= 3]
+    letters = signature(word)
+    subracks = {"".join(g) for n in range(3, len(letters) + 1) for g in combinations(letters, n)}
+    return sorted(j for g in subracks for j in anagramIndex.get(g, ()))
+
+
+racksPath = "storage/anagram_racks.txt"
+
+
+def load_good_racks(count: int=2000, size: int=8, minimum: int=21):
+    """Racks drawn from anagramsDist that make at least MINIMUM words. Finding them takes a few seconds, so they're
+    saved to racksPath, and only found again if the word list or the settings change."""
+    key = sha1(f"{count} {size} {minimum}\n".encode() + "\n".join(wordList).encode()).hexdigest()
+    try:
+        with open(racksPath, "r") as r:
+            lines = r.read().splitlines()
+        if lines and lines[0] == key:
+            return lines[1:]
+    except FileNotFoundError:
+        pass
+    ret = []
+    while len(ret) < count:
+        rack = signature(sample(anagramsDist, size))
+        if len(anagrams(rack)) >= minimum:
+            ret.append(rack)
+    with open(racksPath, "w") as w:
+        w.write("\n".join([key] + ret))
+    return ret
+
+
+goodRacks = LazyAsset("anagram racks", load_good_racks)
+
+
+def good_rack():
+    return sample(choice(goodRacks.value), 8)
 
 
 def format_letter_count(d: dict, length: int):
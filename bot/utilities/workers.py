@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial, wraps
+from os import cpu_count
+from time import time
+
+
+class Pool:
+    """An executor that's only started the first time it's needed, and that keeps track of how backed up it is and
+    how long its jobs take, start to finish."""
+
+    def __init__(self, name: str, executor: type, workers: int):
+        self.name = name
+        self.executorType = executor
+        self.workers = workers
+        self.executor = None
+        self.pending = 0
+        self.done = 0
+        self.totalTime = 0
+        self.longest = 0
+
+    @property
+    def queued(self):
+        return max(self.pending - self.workers, 0)
+
+    async def run(self, func: callable, *args, **kwargs):
+        if self.executor is None:
+            self.executor = self.executorType(self.workers)
+        self.pending += 1
+        start = time()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, partial(func, *args, **kwargs))
+        finally:
+            self.pending -= 1
+            self.done += 1
+            self.totalTime += time() - start
+            self.longest = max(self.longest, time() - start)
+
+    def __str__(self):
+        average = round(1000 * self.totalTime / self.done) if self.done else 0
+        return f"{self.name} ({self.workers}): {self.pending - self.queued} running / {self.queued} queued / " \
+               f"{self.done} done / {average} ms avg / {round(1000 * self.longest)} ms max"
+
+
+threads = Pool("threads", ThreadPoolExecutor, 4)  # numpy and PIL let go of the GIL for most of their work
+processes = Pool("processes", ProcessPoolExecutor, max((cpu_count() or 2) - 1, 1))  # for pure-Python number crunching
+
+
+async def in_thread(func: callable, *args, **kwargs):
+    return await threads.run(func, *args, **kwargs)
+
+
+async def in_process(func: callable, *args, **kwargs):  # FUNC has to be a module-level function, so it can be pickled
+    return await processes.run(func, *args, **kwargs)
+
+
+def offload(func: callable):
+    """Decorator. Turns a blocking function into a coroutine that runs it in the thread pool."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await threads.run(func, *args, **kwargs)
+    return wrapper
+
+
+def report():
+    return "\n".join(str(g) for g in (threads, processes))
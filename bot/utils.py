@@ -1,11 +1,9 @@
 from game import *
-from utilities import dice as di, weed as wd, timein as ti, translate as tr, wiki as wk
+from utilities import dice as di, weed as wd, timein as ti, translate as tr, wiki as wk, web
 import re
-import requests
 from io import BytesIO
 from random import choices
 from unicodedata import name as uni_name
-from urllib.error import HTTPError
 import hanziconv
 import pycantonese
 
@@ -363,38 +361,43 @@ async def color(ctx: commands.Context, *, col: str):
     if not 0 <= ret.value <= 16777215:
         raise commands.CommandError(f"Invalid color {col}.")
     emol = ClientEmol(zeph.emojis["color_wheel"], ret, ctx)
-    rk.global_fill(blankColor, (255, 255, 255), ret.to_rgb())\
-        .save(f"images/{str(ret.r)[-1]}{str(ret.b)[-1]}.png")
-    image = await image_url(f"images/{str(ret.r)[-1]}{str(ret.b)[-1]}.png")
-    return await emol.say(f"#{hex(ret.value)[2:].rjust(6, '0')}", thumb=image,
-                          d=f"**RGB:** {ret.to_rgb()}\n**HSV:** {rgb_to_hsv(*ret.to_rgb())}")
+    swatch = await workers.in_thread(rk.global_fill, blankColor, (255, 255, 255), ret.to_rgb())
+    return await emol.say(f"#{hex(ret.value)[2:].rjust(6, '0')}", thumb=attachment("color.png"),
+                          d=f"**RGB:** {ret.to_rgb()}\n**HSV:** {rgb_to_hsv(*ret.to_rgb())}",
+                          file=await image_file(swatch, "color.png"))
+
+
+async def fetch_image(url: str):
+    try:
+        return await web.fetch(url)
+    except web.FetchError as e:
+        raise commands.CommandError(str(e))
 
 
 @zeph.command(aliases=["hue"])
 async def hueshift(ctx: commands.Context, url: str, shift: int):
     message = await ctx.send("processing...")
-    img = rk.Image.open(BytesIO(requests.get(url).content))
-    rk.shift_hue(img, shift).save("images/hue-shift.png")
+    img = rk.Image.open(BytesIO(await fetch_image(url)))
+    file = await image_file(await workers.in_thread(rk.shift_hue, img, shift), "hue-shift.png")
     await message.delete()
-    return await ctx.send(file=discord.File("images/hue-shift.png"))
+    return await ctx.send(file=file)
 
 
 @zeph.command()
 async def invert(ctx: commands.Context, url: str):
-    img = rk.Image.open(BytesIO(requests.get(url).content))
-    rk.invert_colors(img).save("images/invert.png")
-    return await ctx.send(file=discord.File("images/invert.png"))
+    img = rk.Image.open(BytesIO(await fetch_image(url)))
+    return await ctx.send(file=await image_file(await workers.in_thread(rk.invert_colors, img), "invert.png"))
 
 
 @zeph.command()
 async def timein(ctx: commands.Context, *, place: str):
     try:
-        ret = ti.format_dict(ti.timein(place), False)
+        ret = ti.format_dict(await web.run_blocking(ti.timein, place), False)
     except IndexError:
         raise commands.CommandError("Location not found.")
     except KeyError:
         raise commands.CommandError("Location too vague.")
-    address = ", ".join(ti.getcity(place))
+    address = ", ".join(await web.run_blocking(ti.getcity, place))
     if address == "Unable to precisely locate.":
         raise commands.CommandError("Location too vague.")
     emoji = ret.split()[0]
@@ -461,11 +464,11 @@ async def translate(ctx: commands.Context, fro: str, to: str, *, text: str):
         raise commands.CommandError("Text length is limited to 250 characters.")
 
     if fro == "auto":
-        lang = tr.translator.detect(text).lang
+        lang = (await web.run_blocking(tr.translator.detect, text)).lang
     else:
         lang = fro
 
-    translation = tr.translator.translate(text, to, fro)
+    translation = await web.run_blocking(tr.translator.translate, text, to, fro)
     return await trans.say(
         translation.text, footer="{}{} -> {}".format("detected: " if fro == "auto" else "",
                                                      tr.LANGUAGES[lang].title(), tr.LANGUAGES[to].title())
@@ -474,9 +477,9 @@ async def translate(ctx: commands.Context, fro: str, to: str, *, text: str):
 
 async def get_translation(fro: str, to: str, text: str):
     """Turning this into a coroutine for use with badtranslate(). In previous versions, using non-coroutines would
-    actually kill the bot, as it took too long to run all of the translation requests. Since coroutines are awaited,
-    this should prevent this from happening."""
-    return tr.Translator().translate(text, to, fro).text
+    actually kill the bot, as it took too long to run all of the translation requests. The request itself runs off
+    the event loop, so the rest of the bot keeps going while it waits."""
+    return (await web.run_blocking(tr.Translator().translate, text, to, fro)).text
 
 
 @zeph.command(aliases=["badtrans"])
@@ -616,7 +619,10 @@ class WikiNavigator(Navigator):
 @zeph.command(aliases=["wiki"])
 async def wikipedia(ctx: commands.Context, *, title: str):
     parser = wk.WikiParser()
-    parser.feed(wk.readurl(wk.wikiSearch.format("+".join(title.split()))))
+    try:
+        parser.feed(await wk.readurl(wk.wikiSearch.format("+".join(title.split()))))
+    except web.FetchError:
+        raise commands.CommandError("Couldn't reach Wikipedia.")
     try:
         return await WikiNavigator(*parser.results).run(ctx)
     except IndexError:
@@ -627,8 +633,8 @@ async def wikipedia(ctx: commands.Context, *, title: str):
 async def foreignwiki(ctx: commands.Context, lang: str, *, title: str):
     parser = wk.ForeignParser()
     try:
-        parser.feed(wk.readurl(wk.wikilink.format("_".join(title.split()))))
-    except HTTPError:
+        parser.feed(await wk.readurl(wk.wikilink.format("_".join(title.split()))))
+    except web.FetchError:
         raise commands.CommandError("Article not found in English.")
     if lang.casefold() == "all":
         return await Navigator(wiki, [parser.form(g) for g in parser.lang_link], 8,
@@ -744,3 +750,8 @@ async def phone_command(ctx: commands.Context, func: str = "help", channel: str=
 @zeph.command(hidden=True)
 async def save(ctx: commands.Context):
     zeph.save()
+
+
+@zeph.command(hidden=True)
+async def pools(ctx: commands.Context):
+    return await ctx.send(f"```{workers.report()}```")